@@ -1,7 +1,6 @@
 #modules/libraries
 import pygame, sys
 from pygame.locals import *
-import random
 
 #imported scripts
 import level
@@ -9,98 +8,187 @@ from level_constants import *
 import gameplay
 from gameplay_constants import *
 import display
+from level_queue import LevelQueue
 
 
 #set False to mute music
 MUSIC = True
+#set False to hide the frame timings in the display area
+PROFILE = True
+#file to log the frame timings to as CSV, None to not log them
+PROFILE_CSV = None
 
 #global variables
+#levels generated ahead of the one being played (see main)
+levels = None
 dungeon = None
 weightedgrid = None
 player = None
+#store of the enemies of the level (see gameplay.EnemyStore)
 allenemies = []
+#enemies by position, for attacks and other proximity checks
+enemyhash = None
+#screen areas covered by sprites on the previous frame
+sprite_rects = []
+#set when the whole window has to be pushed to the display
+full_update = True
+#panel to the right of the dungeon
+display_area = display.DisplayArea()
 
 def create_level():
     global dungeon
     global weightedgrid
     global player
     global allenemies
-
-    dungeon = level.Dungeon()
-
-    player_room = dungeon.pick_random_room()
-    player_spawn_point = player_room.pick_interior_point()
-    player_spawn_point = tuple([c*TILE_SIZE for c in player_spawn_point])
-    player = gameplay.Player(player_spawn_point[0], player_spawn_point[1], 0)
-
-    num_enemies = random.randint(1, 5)
-
-    for enemy in range(num_enemies):
-        enemy_room = random.choice(dungeon.filter_rooms(player_room))
-        enemy_spawn_point = enemy_room.pick_interior_point()
-        enemy_spawn_point = tuple([c*TILE_SIZE for c in enemy_spawn_point])
-
-        enemy = gameplay.Enemy(enemy_spawn_point[0], enemy_spawn_point[1], \
-                random.randint(1, 2))
-        allenemies.append(enemy)
-
-    dungeon.place_ladder(player_room)
-
-    weightedgrid = gameplay.WeightedTileGrid(MAP_WIDTH,MAP_HEIGHT)
-    weightedgrid.getwalls(dungeon)
-
-    da = display.DisplayArea()
-    da.fill_area()
-
-if MUSIC:
-    pygame.mixer.music.load(song1)
-    pygame.mixer.music.play(-1)
-
-create_level()
-running = True
-
-while running:
+    global enemyhash
+    global sprite_rects
+    global full_update
+
+    #levels are generated ahead of time, starting one is only a swap
+    newlevel = levels.getlevel()
+    dungeon = newlevel.dungeon
+    weightedgrid = newlevel.weightedgrid
+    player = newlevel.spawnplayer()
+    allenemies = newlevel.spawnenemies()
+    enemyhash = gameplay.SpatialHash()
+    enemyhash.rebuild(allenemies)
+
+    dungeon.follow(player.rect.topleft)
     dungeon.draw((dungeon.width,), (dungeon.height,))
-
-    #win game/next level
-    if dungeon.check_ladder_reached(player):
-        print("Ladder reached")
-        create_level()
-
-    player.draw()
-    gameplay.checkhp(allenemies)
-    for enemy in allenemies:
-        enemy.draw()
-
-    for event in pygame.event.get():
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                player.attack(allenemies)
-        if event.type == QUIT:
+    dungeon.pop_dirty_rects()
+    display_area.fill_area()
+
+    sprite_rects = []
+    full_update = True
+
+def main(frames=None):
+    '''
+    Run the game until the window is closed or the player dies.
+    Args:
+        frames (int): stop after this many frames, None to not stop
+                      (e.g. to step the game loop in a smoke test)
+    '''
+    global levels
+    global full_update
+    global sprite_rects
+
+    #load the remaining images and sounds while the first level is generated
+    assets.prewarm(tile_images, spriteimages, soundeffects)
+
+    #no mixer when headless (see HEADLESS in level_constants.py)
+    if MUSIC and not HEADLESS:
+        pygame.mixer.music.load(song1)
+        pygame.mixer.music.play(-1)
+
+    #generates the next levels in the background while the current one
+    #is played
+    levels = LevelQueue()
+    create_level()
+    running = True
+    #runs the enemies at a fixed rate, independent of the frame rate
+    timestep = gameplay.FixedTimestep(SIMULATION_STEP)
+    elapsed = 0
+
+    #times each phase of the frames
+    profiler = display.FrameProfiler(csvpath=PROFILE_CSV)
+    #time spent finding next tiles by ai type, filled in by the chase passes
+    chase_timings = {}
+
+    while running and (frames is None or profiler.frame < frames):
+        with profiler.section('dungeon draw'):
+            #scroll the view with the player (redraws the whole view)
+            if not dungeon.follow(player.rect.topleft):
+                #erase last frame's sprites
+                dirty_rects = [dungeon.clear(rect) for rect in sprite_rects]
+            else:
+                dirty_rects = []
+            #redraw tiles that changed
+            dirty_rects += dungeon.pop_dirty_rects()
+
+        with profiler.section('level'):
+            #win game/next level
+            if dungeon.check_ladder_reached(player):
+                print("Ladder reached")
+                create_level()
+
+        with profiler.section('checkhp'):
+            gameplay.checkhp(allenemies, enemyhash)
+
+        with profiler.section('entity draw'):
+            camera = dungeon.camera
+            sprite_rects = [player.draw(camera)]
+            #only the enemies within the view
+            for enemy in enemyhash.query_rect(camera.visible_area()):
+                sprite_rects.append(enemy.draw(camera))
+
+        with profiler.section('events'):
+            #no window to get events from when headless
+            for event in ([] if HEADLESS else pygame.event.get()):
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        player.attack(enemyhash)
+                if event.type == QUIT:
+                    running = False
+
+        for step in range(timestep.advance(elapsed)):
+            #one pass over the arrays of the enemy store for each update
+            with profiler.section('tick'):
+                allenemies.tick(SIMULATION_STEP)
+            with profiler.section('chase'):
+                for enemy in allenemies.chase(player, weightedgrid,
+                                              chase_timings):
+                    enemyhash.update(enemy)
+            with profiler.section('attack'):
+                allenemies.attack(player)
+        for ai, ms in chase_timings.items():
+            profiler.add('  ' + aidict.get(ai, str(ai)), ms)
+        chase_timings.clear()
+
+        if player.died():
+            player.draw(dungeon.camera)
+            if not HEADLESS:
+                pygame.display.update()
+            print("GAME OVER")
+            #let the game over sound finish before the window closes
+            sounds.wait()
             running = False
 
-    for enemy in allenemies:
-        enemy.chase_player(player, weightedgrid)
-        enemy.attack(player)
-
-    if player.died():
-        player.draw()
-        pygame.display.update()
-        print("GAME OVER")
-        running = False
-
-    keys_pressed = pygame.key.get_pressed()
-    if keys_pressed[K_LEFT]:
-        player.move(-1,0,dungeon.tile_map)
-    if keys_pressed[K_RIGHT]:
-        player.move(1,0,dungeon.tile_map)
-    if keys_pressed[K_UP]:
-        player.move(0,1,dungeon.tile_map)
-    if keys_pressed[K_DOWN]:
-        player.move(0,-1,dungeon.tile_map)
-
-    pygame.display.update()
-    fpsClock.tick(FPS)
-
-pygame.quit()
-sys.exit()
+        with profiler.section('input'):
+            if not HEADLESS:
+                keys_pressed = pygame.key.get_pressed()
+                if keys_pressed[K_LEFT]:
+                    player.move(-1,0,dungeon.tile_map)
+                if keys_pressed[K_RIGHT]:
+                    player.move(1,0,dungeon.tile_map)
+                if keys_pressed[K_UP]:
+                    player.move(0,1,dungeon.tile_map)
+                if keys_pressed[K_DOWN]:
+                    player.move(0,-1,dungeon.tile_map)
+
+        if PROFILE and profiler.frame % PROFILE_REFRESH == 0:
+            with profiler.section('overlay'):
+                sprite_rects.append(display_area.draw_profile(profiler))
+
+        with profiler.section('display update'):
+            #no window to update when headless
+            if not HEADLESS:
+                if full_update:
+                    pygame.display.update()
+                else:
+                    pygame.display.update(dirty_rects + sprite_rects)
+            full_update = False
+
+        with profiler.section('sound'):
+            #play the sound effects queued this frame
+            sounds.flush()
+        profiler.endframe()
+        elapsed = clock.tick(FPS)
+
+    profiler.close()
+    levels.shutdown()
+
+
+if __name__ == '__main__':
+    main()
+    pygame.quit()
+    sys.exit()
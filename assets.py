@@ -0,0 +1,126 @@
+# Loads images and sounds the first time they are used and keeps them in a
+# single cache, so importing the game (or running it headless) does not pay
+# for assets that are never drawn or played.
+
+#modules/libraries
+import pygame
+import threading
+from collections.abc import Mapping
+
+from headless import NullSurface, NullSound
+
+
+class AssetCache():
+    '''
+    Cache of loaded images and sounds.
+    Images are converted to the format of the display once and kept,
+    together with any scaled variants, under a key made of the path and
+    the options used to load them.
+    Args:
+        headless (bool): give out NullSurface and NullSound stand-ins
+                        instead of loading files
+        placeholder_size (tuple): size of the stand-in images when headless
+    '''
+    def __init__(self, headless=False, placeholder_size=(0, 0)):
+        self.headless = headless
+        self.placeholder_size = placeholder_size
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def image(self, path, alpha=False, size=None):
+        '''
+        Get an image, loading it on first use.
+        Args:
+            path (str): path of the image file
+            alpha (bool): keep the transparency of the image
+            size (tuple): width and height to scale the image to,
+                        None to keep its size
+        Returns:
+            image (Surface): converted (and scaled) image
+        '''
+        key = ('image', path, alpha, size)
+        image = self.cache.get(key)
+        if image is None:
+            if self.headless:
+                image = NullSurface(size or self.placeholder_size)
+            elif size is not None:
+                image = pygame.transform.scale(self.image(path, alpha), size)
+            elif alpha:
+                image = pygame.image.load(path).convert_alpha()
+            else:
+                image = pygame.image.load(path).convert()
+            image = self.store(key, image)
+        return image
+
+    def sound(self, path):
+        '''
+        Get a sound effect, loading it on first use.
+        Args:
+            path (str): path of the sound file
+        Returns:
+            sound (Sound): loaded sound
+        '''
+        key = ('sound', path)
+        sound = self.cache.get(key)
+        if sound is None:
+            if self.headless:
+                sound = NullSound()
+            else:
+                sound = pygame.mixer.Sound(path)
+            sound = self.store(key, sound)
+        return sound
+
+    def store(self, key, asset):
+        '''
+        Put an asset in the cache unless another thread already did,
+        and return the cached one.
+        '''
+        with self.lock:
+            return self.cache.setdefault(key, asset)
+
+    def prewarm(self, *assetmaps, background=True):
+        '''
+        Load every asset of the given maps ahead of time,
+        e.g. while the title or a loading screen is shown.
+        Args:
+            assetmaps (AssetMap): maps of assets to load
+            background (bool): load in a daemon thread instead of now
+        Returns:
+            thread (Thread): the loading thread, None if not in background
+        '''
+        def load():
+            for assetmap in assetmaps:
+                for key in assetmap:
+                    assetmap[key]
+
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+
+class AssetMap(Mapping):
+    '''
+    Read-only dictionary of assets by key (e.g. tile id or sprite number).
+    Only the paths are stored; each asset is loaded through the cache
+    the first time it is looked up.
+    Args:
+        load (function): loading method of an AssetCache (image or sound)
+        paths (dict): dictionary of file paths by key
+        options: keyword arguments passed on to load (e.g. alpha=True)
+    '''
+    def __init__(self, load, paths, **options):
+        self.load = load
+        self.paths = paths
+        self.options = options
+
+    def __getitem__(self, key):
+        return self.load(self.paths[key], **self.options)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
@@ -0,0 +1,147 @@
+# Plays sound effects from a queue of events, so the game loop never waits
+# on the mixer and many enemies attacking or dying in the same frame do not
+# flood it with copies of the same sound.
+
+#modules/libraries
+import pygame
+import time
+import collections
+
+
+class SoundManager():
+    '''
+    Queue of sound events, played once per frame by flush.
+    Within a frame the same event is only played once, and an event is
+    not played again until interval milliseconds after it last was.
+    Each event has a priority: when every channel is busy, a new sound
+    takes over the channel playing the lowest priority sound, if that is
+    lower than its own, and is dropped otherwise.
+    Args:
+        sounds (Mapping): sound effect of each event (e.g. soundeffects)
+        priorities (dict): priority of each event, higher wins,
+                        events not listed have priority 0
+        channels (int): number of mixer channels to play the sounds on
+        interval (int): shortest time between two plays of an event (ms)
+        headless (bool): play through the sounds themselves instead of
+                        mixer channels (e.g. NullSound stand-ins)
+    '''
+    def __init__(self, sounds, priorities=None, channels=8, interval=0,
+                 headless=False):
+        self.sounds = sounds
+        self.priorities = priorities or {}
+        self.numchannels = channels
+        self.interval = interval
+        self.headless = headless
+        self.events = collections.deque()
+        #time each event was last played, in milliseconds
+        self.lastplayed = {}
+        #mixer channels and the priority of what each is playing,
+        #set up on the first flush once the mixer is initialized
+        self.channels = None
+        self.channelpriorities = []
+
+    def post(self, event):
+        '''
+        Ask for a sound to be played at the end of the frame.
+        Args:
+            event (int): key of the sound effect
+        '''
+        self.events.append(event)
+
+    def getchannels(self):
+        '''
+        Returns:
+            channels (list): mixer channels reserved for the sound effects,
+                            empty when headless
+        '''
+        if self.channels is None:
+            if self.headless or not pygame.mixer.get_init():
+                self.channels = []
+            else:
+                if pygame.mixer.get_num_channels() < self.numchannels:
+                    pygame.mixer.set_num_channels(self.numchannels)
+                #keep Sound.play from picking these channels
+                pygame.mixer.set_reserved(self.numchannels)
+                self.channels = [pygame.mixer.Channel(i)
+                                 for i in range(self.numchannels)]
+            self.channelpriorities = [0] * len(self.channels)
+        return self.channels
+
+    def pickchannel(self, priority):
+        '''
+        Find a channel for a sound: an idle one, or else the one playing
+        the lowest priority sound if it is lower than priority.
+        Returns:
+            index (int): index of the channel, None if there is none
+        '''
+        lowest = None
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+            if lowest is None \
+            or self.channelpriorities[index] < self.channelpriorities[lowest]:
+                lowest = index
+        if lowest is not None and self.channelpriorities[lowest] < priority:
+            return lowest
+        return None
+
+    def flush(self, now=None):
+        '''
+        Play the sounds of the events posted since the last flush,
+        highest priority first. Never waits for the mixer.
+        Args:
+            now (float): current time in milliseconds,
+                        read from a monotonic clock by default
+        Returns:
+            played (list): events that were played
+        '''
+        if not self.events:
+            return []
+        if now is None:
+            now = time.monotonic() * 1000
+        channels = self.getchannels()
+        #one of each event, in order of priority then of posting
+        events = sorted(dict.fromkeys(self.events),
+                        key=lambda event: -self.priorities.get(event, 0))
+        self.events.clear()
+
+        played = []
+        for event in events:
+            last = self.lastplayed.get(event)
+            if last is not None and now - last < self.interval:
+                continue
+            priority = self.priorities.get(event, 0)
+            if channels:
+                index = self.pickchannel(priority)
+                if index is None:
+                    continue
+                channels[index].play(self.sounds[event])
+                self.channelpriorities[index] = priority
+            else:
+                self.sounds[event].play()
+            self.lastplayed[event] = now
+            played.append(event)
+        return played
+
+    def busy(self):
+        '''
+        Returns:
+            busy (bool): True while a sound effect is playing
+        '''
+        return any(channel.get_busy() for channel in self.getchannels())
+
+    def wait(self, timeout=None):
+        '''
+        Play what is queued and block until every sound effect has ended.
+        Only for when the game loop is over (game over or exit).
+        Args:
+            timeout (int): longest time to wait in milliseconds,
+                        None to wait as long as it takes
+        '''
+        self.flush()
+        start = time.monotonic()
+        while self.busy():
+            if timeout is not None \
+            and (time.monotonic() - start) * 1000 >= timeout:
+                break
+            pygame.time.wait(5)
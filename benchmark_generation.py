@@ -0,0 +1,208 @@
+# Benchmark of dungeon generation in level.py.
+# Generates seeded dungeons of several sizes headless, running the steps
+# of Dungeon one at a time, and reports the time taken by each phase
+# (partition, rooms, hallways, borders, render, ladder) together with the
+# memory it allocates and its peak memory use.
+# Run with "python3 benchmark_generation.py --help" for the options.
+
+#modules/libraries
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+#no window or audio device needed (see HEADLESS in level_constants.py)
+os.environ.setdefault("YADC_HEADLESS", "1")
+#keep standard output clean for --json -
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+#imported scripts
+import level
+from level_constants import *
+from benchmark_pathfinding import percentiles
+
+#phases of the generation of a dungeon, in order
+PHASES = ('partition', 'rooms', 'hallways', 'borders', 'render', 'ladder')
+
+
+def runphase(dungeon, phase):
+    '''
+    Run one phase of the generation of a dungeon.
+    Args:
+        dungeon (Dungeon): dungeon created with generate=False
+        phase (str): name of the phase, one of PHASES
+    '''
+    if phase == 'partition':
+        dungeon.partition = dungeon.split_region(0, 0, dungeon.width,
+                                                 dungeon.height)
+    elif phase == 'rooms':
+        dungeon.create_rooms(dungeon.partition)
+    elif phase == 'hallways':
+        dungeon.connect_partitions(dungeon.partition)
+    elif phase == 'borders':
+        dungeon.create_all_hallway_borders()
+    elif phase == 'render':
+        dungeon.tile_map.render()
+    elif phase == 'ladder':
+        dungeon.place_ladder(dungeon.pick_random_room())
+
+
+def timephases(size, seed):
+    '''
+    Generate a dungeon and time each phase.
+    Args:
+        size (int): width and height of the dungeon in tiles
+        seed (int): seed of the dungeon
+    Returns:
+        times (dict): time of each phase in milliseconds
+        dungeon (Dungeon): the generated dungeon
+    '''
+    dungeon = level.Dungeon(size, size, seed, generate=False)
+    times = {}
+    for phase in PHASES:
+        began = time.perf_counter()
+        runphase(dungeon, phase)
+        times[phase] = (time.perf_counter() - began) * 1000
+    return times, dungeon
+
+
+def tracephases(size, seed):
+    '''
+    Generate a dungeon and trace the memory allocated by each phase.
+    Done apart from timephases since tracing slows every allocation down.
+    Args:
+        size (int): width and height of the dungeon in tiles
+        seed (int): seed of the dungeon
+    Returns:
+        allocated (dict): memory still allocated after each phase, in bytes
+        peaks (dict): most memory in use during each phase, in bytes
+                    (above what was in use before it)
+    '''
+    allocated = {}
+    peaks = {}
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        dungeon = level.Dungeon(size, size, seed, generate=False)
+        for phase in PHASES:
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            runphase(dungeon, phase)
+            current, peak = tracemalloc.get_traced_memory()
+            allocated[phase] = current - start
+            peaks[phase] = peak - start
+        allocated['total'] = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return allocated, peaks
+
+
+def benchmark(sizes, dungeons, seed, memory=True):
+    '''
+    Run the benchmark.
+    Args:
+        sizes (list): width and height of the dungeons, in tiles
+        dungeons (int): number of dungeons generated for each size
+        seed (int): seed of the dungeons
+        memory (bool): also trace the memory of each phase
+    Returns:
+        results (list): one dict of measurements per size
+    '''
+    results = []
+    for size in sizes:
+        rng = random.Random('%d-%d' % (seed, size))
+        seeds = [rng.getrandbits(32) for i in range(dungeons)]
+        times = {phase: [] for phase in PHASES + ('total',)}
+        rooms = []
+        for dungeonseed in seeds:
+            phasetimes, dungeon = timephases(size, dungeonseed)
+            for phase, taken in phasetimes.items():
+                times[phase].append(taken)
+            times['total'].append(sum(phasetimes.values()))
+            rooms.append(len(dungeon.rooms))
+        result = {
+            'size': size,
+            'dungeons': dungeons,
+            'rooms': float(np.mean(rooms)),
+            'time_ms': {phase: percentiles(values)
+                        for phase, values in times.items()}
+        }
+        if memory:
+            allocated = {phase: [] for phase in PHASES + ('total',)}
+            peaks = {phase: [] for phase in PHASES}
+            for dungeonseed in seeds:
+                phaseallocated, phasepeaks = tracephases(size, dungeonseed)
+                for phase, value in phaseallocated.items():
+                    allocated[phase].append(value)
+                for phase, value in phasepeaks.items():
+                    peaks[phase].append(value)
+            result['allocated_bytes'] = {phase: float(np.mean(values))
+                                         for phase, values in allocated.items()}
+            result['peak_bytes'] = {phase: float(np.max(values))
+                                    for phase, values in peaks.items()}
+        results.append(result)
+    return results
+
+
+def printresults(results):
+    '''Print the mean time (and memory) of each phase as a table.'''
+    for result in results:
+        print('size %d: %d dungeons, %.1f rooms on average' % (
+            result['size'], result['dungeons'], result['rooms']))
+        print('  %-10s %10s %10s %12s %12s' % (
+            'phase', 'mean ms', 'p90 ms', 'allocated', 'peak'))
+        for phase in PHASES + ('total',):
+            line = '  %-10s %10.3f %10.3f' % (
+                phase, result['time_ms'][phase]['mean'],
+                result['time_ms'][phase]['p90'])
+            if 'allocated_bytes' in result:
+                line += ' %10.1fkB' % (
+                    result['allocated_bytes'][phase] / 1024)
+                if phase in result['peak_bytes']:
+                    line += ' %10.1fkB' % (result['peak_bytes'][phase] / 1024)
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the phases of dungeon generation.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[20, 50, 100, 200],
+                        help='width and height of the dungeons in tiles')
+    parser.add_argument('--dungeons', type=int, default=5,
+                        help='dungeons generated for each size')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the dungeons')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='only time the phases, without tracing memory')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results as JSON to FILE '
+                             '("-" for standard output)')
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.sizes, args.dungeons, args.seed, args.memory)
+    if args.json != '-':
+        printresults(results)
+    if args.json:
+        report = {
+            'benchmark': 'generation',
+            'config': vars(args),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'results': results
+        }
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as output:
+                json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
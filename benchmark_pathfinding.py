@@ -0,0 +1,261 @@
+# Benchmark of the search algorithms of gameplay.py on generated dungeons.
+# Generates seeded dungeons of several sizes headless, samples start and
+# goal tiles in them and reports for each algorithm the time taken per
+# search, the number of tiles expanded and how close the paths are to the
+# cheapest ones. The same seed gives the same dungeons and tiles, so the
+# JSON output can be compared between runs to track regressions.
+# Only tiles are counted as expanded, not the portals hierarchicalsearch
+# searches first, and it reuses the paths between portals it found in the
+# earlier searches of a dungeon, like the enemies of a level do.
+# The tiles jumppointsearch passes over between jump points are not
+# expanded either, and it ignores the tile costs like breadthfirstsearch.
+# Run with "python3 benchmark_pathfinding.py --help" for the options.
+
+#modules/libraries
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import numpy as np
+
+#no window or audio device needed (see HEADLESS in level_constants.py)
+os.environ.setdefault("YADC_HEADLESS", "1")
+#keep standard output clean for --json -
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+#imported scripts
+import level
+from level_constants import *
+import gameplay
+from gameplay_constants import *
+
+#algorithms that can be benchmarked, by name
+ALGORITHMS = {
+    'depthfirstsearch': gameplay.depthfirstsearch,
+    'breadthfirstsearch': gameplay.breadthfirstsearch,
+    'dijkstra': gameplay.dijkstra,
+    'bestfirstsearch': gameplay.bestfirstsearch,
+    'astarsearch': gameplay.astarsearch,
+    'jumppointsearch': gameplay.jumppointsearch,
+    'hierarchicalsearch': gameplay.hierarchicalsearch
+}
+
+
+class CountingGrid():
+    '''
+    Wraps a grid and counts the calls to neighbors,
+    which is the number of tiles a search expands.
+    Everything else is passed through to the wrapped grid.
+    Args:
+        graph (TileGrid): grid to wrap
+    '''
+    def __init__(self, graph):
+        self.graph = graph
+        self.expanded = 0
+
+    def neighbors(self, loc):
+        self.expanded += 1
+        return self.graph.neighbors(loc)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+def pathcost(graph, path):
+    '''
+    Args:
+        graph (WeightedTileGrid): grid the path was found on
+        path (list): list of tiles from start to end
+    Returns:
+        cost (int): sum of the costs of the steps of the path
+    '''
+    return sum(graph.cost(current, nexttile)
+               for current, nexttile in zip(path, path[1:]))
+
+
+def samplepairs(graph, rng, count, goals, inside=None):
+    '''
+    Pick start and goal tiles that are connected.
+    Args:
+        graph (WeightedTileGrid): grid of the dungeon
+        rng (Random): random number generator
+        count (int): number of pairs
+        goals (int): number of different goals the pairs share
+        inside (ndarray): tiles the goals may be picked from,
+                        any walkable tile if None
+    Returns:
+        pairs (list): (start, goal, optimal cost) tuples
+    '''
+    allowed = graph.walkable if inside is None else graph.walkable & inside
+    walkable = [tuple(loc) for loc in np.argwhere(allowed).tolist()]
+    pairs = []
+    for i in range(goals):
+        goal = rng.choice(walkable)
+        #cheapest cost from every tile connected to the goal
+        nextstep, costs = gameplay.flowfield(graph, goal)
+        starts = sorted(loc for loc in costs if loc != goal)
+        if not starts:
+            continue
+        for j in range(count // goals + (i < count % goals)):
+            start = rng.choice(starts)
+            pairs.append((start, goal, costs[start]))
+    return pairs
+
+
+def percentiles(values):
+    '''
+    Args:
+        values (list): measurements
+    Returns:
+        summary (dict): mean, median, 90th and 99th percentile and maximum
+    '''
+    values = np.asarray(values, dtype=float)
+    return {
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max())
+    }
+
+
+def runsearch(search, graph, pairs):
+    '''
+    Run one algorithm on every pair.
+    Args:
+        search (function): search algorithm of gameplay.py
+        graph (WeightedTileGrid): grid of the dungeon
+        pairs (list): (start, goal, optimal cost) tuples
+    Returns:
+        latencies (list): time of each search and getpath in milliseconds
+        expanded (list): tiles expanded by each search
+        ratios (list): cost of each path divided by the cheapest cost
+    '''
+    latencies = []
+    expanded = []
+    ratios = []
+    counting = CountingGrid(graph)
+    for start, goal, optimal in pairs:
+        began = time.perf_counter()
+        path = gameplay.getpath(search(graph, start, goal), start, goal)
+        latencies.append((time.perf_counter() - began) * 1000)
+        #counted in a second run so the wrapper is not timed
+        counting.expanded = 0
+        search(counting, start, goal)
+        expanded.append(counting.expanded)
+        ratios.append(pathcost(graph, path) / optimal)
+    return latencies, expanded, ratios
+
+
+def benchmark(sizes, dungeons, pairs, goals, seed, algorithms):
+    '''
+    Run the benchmark.
+    Args:
+        sizes (list): width and height of the dungeons, in tiles
+        dungeons (int): number of dungeons generated for each size
+        pairs (int): number of start and goal pairs in each dungeon
+        goals (int): number of different goals in each dungeon
+        seed (int): seed of the dungeons and the pairs
+        algorithms (list): names of the algorithms to run
+    Returns:
+        results (list): one dict of measurements per size and algorithm
+    '''
+    results = []
+    for size in sizes:
+        rng = random.Random('%d-%d' % (seed, size))
+        measured = {name: ([], [], []) for name in algorithms}
+        for i in range(dungeons):
+            dungeon = level.Dungeon(size, size, rng.getrandbits(32))
+            graph = gameplay.WeightedTileGrid(size, size)
+            graph.getwalls(dungeon)
+            #built with the level, like in level_queue.py, so not timed
+            graph.getnavgraph(dungeon)
+            #void tiles are walkable but outside of the rooms and hallways
+            sample = samplepairs(graph, rng, pairs, goals,
+                dungeon.tile_map.region(Rect(0, 0, size, size)) != VOID)
+            for name in algorithms:
+                for total, values in zip(measured[name],
+                        runsearch(ALGORITHMS[name], graph, sample)):
+                    total.extend(values)
+        for name in algorithms:
+            latencies, expanded, ratios = measured[name]
+            if not latencies:
+                continue
+            results.append({
+                'size': size,
+                'algorithm': name,
+                'searches': len(latencies),
+                'latency_ms': percentiles(latencies),
+                'expanded': percentiles(expanded),
+                'optimality': {
+                    'optimal': sum(ratio == 1 for ratio in ratios)
+                               / len(ratios),
+                    'mean_ratio': float(np.mean(ratios)),
+                    'max_ratio': float(np.max(ratios))
+                }
+            })
+    return results
+
+
+def printresults(results):
+    '''Print the results as a table.'''
+    print('%6s %-20s %8s %9s %9s %9s %9s %8s %8s' % (
+        'size', 'algorithm', 'searches', 'p50 ms', 'p90 ms', 'p99 ms',
+        'expanded', 'optimal', 'ratio'))
+    for result in results:
+        print('%6d %-20s %8d %9.3f %9.3f %9.3f %9.1f %7.0f%% %8.3f' % (
+            result['size'], result['algorithm'], result['searches'],
+            result['latency_ms']['p50'], result['latency_ms']['p90'],
+            result['latency_ms']['p99'], result['expanded']['mean'],
+            result['optimality']['optimal'] * 100,
+            result['optimality']['mean_ratio']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pathfinding algorithms on generated '
+                    'dungeons.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100],
+                        help='width and height of the dungeons in tiles')
+    parser.add_argument('--dungeons', type=int, default=3,
+                        help='dungeons generated for each size')
+    parser.add_argument('--pairs', type=int, default=20,
+                        help='start and goal pairs searched in each dungeon')
+    parser.add_argument('--goals', type=int, default=4,
+                        help='different goals among the pairs of a dungeon')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the dungeons and pairs')
+    parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS),
+                        choices=list(ALGORITHMS),
+                        help='algorithms to run')
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results as JSON to FILE '
+                             '("-" for standard output)')
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.sizes, args.dungeons, args.pairs,
+                        max(1, min(args.goals, args.pairs)), args.seed,
+                        args.algorithms)
+    if args.json != '-':
+        printresults(results)
+    if args.json:
+        report = {
+            'benchmark': 'pathfinding',
+            'config': vars(args),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'results': results
+        }
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as output:
+                json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,10 @@
 import pygame, sys
 from pygame.locals import *
 import random
+import time
+import csv
+import collections
+import contextlib
 
 #imported scripts
 import level
@@ -11,18 +15,134 @@ from gameplay_constants import *
 
 class DisplayArea():
     def __init__(self):
-        self.screen = pygame.display.get_surface()
+        self.screen = DISPLAY_SURFACE
         # Top left corner of area to the right of the dungeon
-        self.x = MAP_WIDTH*TILE_SIZE
+        self.x = VIEW_WIDTH*TILE_SIZE
         self.y = 0
         # Dimensions of display area
         self.width = DISPLAY_AREA_WIDTH*TILE_SIZE
-        self.height = MAP_HEIGHT*TILE_SIZE
+        self.height = VIEW_HEIGHT*TILE_SIZE
         self.colour = SILVER
+        self.font = None
 
     def fill_area(self):
-        self.screen.fill(self.colour, [self.x, self.y, self.width, self.height])
+        return self.screen.fill(self.colour,
+            [self.x, self.y, self.width, self.height])
+
+    def draw_profile(self, profiler):
+        # Writes the average time of each phase of the frame into the area
+        rect = self.fill_area()
+        if HEADLESS:
+            return rect
+        if self.font is None:
+            self.font = pygame.font.Font(None, PROFILE_FONT_SIZE)
+        y = self.y + PROFILE_MARGIN
+        for name, value in profiler.rows():
+            text = self.font.render(name, True, BLACK)
+            self.screen.blit(text, (self.x + PROFILE_MARGIN, y))
+            # times are right aligned
+            text = self.font.render(value, True, BLACK)
+            self.screen.blit(text, text.get_rect(
+                topright=(self.x + self.width - PROFILE_MARGIN, y)))
+            y += self.font.get_linesize()
+        return rect
 
 class HealthBar():
     def __init__(self):
         pass
+
+
+class FrameProfiler():
+    '''
+    Times the phases of each frame of the game loop and keeps a rolling
+    average of each over the last frames, optionally logging every
+    measurement to a CSV file (one frame,phase,ms row each).
+    Args:
+        window (int): number of frames averaged
+        csvpath (str): path of the CSV file to write, None to not log
+    '''
+    def __init__(self, window=PROFILE_WINDOW, csvpath=None):
+        self.window = window
+        self.frame = 0
+        #time of each phase in the current frame, in milliseconds
+        self.current = collections.OrderedDict()
+        #times of each phase over the last frames
+        self.history = collections.OrderedDict()
+        self.framestart = time.perf_counter()
+        self.csvfile = None
+        self.writer = None
+        if csvpath is not None:
+            self.csvfile = open(csvpath, 'w', newline='')
+            self.writer = csv.writer(self.csvfile)
+            self.writer.writerow(['frame', 'phase', 'ms'])
+
+    @contextlib.contextmanager
+    def section(self, name):
+        '''
+        Time the code run in a with block as part of phase name.
+        '''
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - began) * 1000)
+
+    def add(self, name, ms):
+        '''
+        Add time to a phase of the current frame.
+        Args:
+            name (str): name of the phase
+            ms (float): time in milliseconds
+        '''
+        self.current[name] = self.current.get(name, 0) + ms
+
+    def endframe(self):
+        '''
+        Close the current frame: record its phases and the time the whole
+        frame took (including waiting for the next one), then start a new
+        frame.
+        '''
+        now = time.perf_counter()
+        self.current['frame'] = (now - self.framestart) * 1000
+        self.framestart = now
+        for name in self.history:
+            if name not in self.current:
+                self.current[name] = 0
+        for name, ms in self.current.items():
+            if name not in self.history:
+                self.history[name] = collections.deque(maxlen=self.window)
+            self.history[name].append(ms)
+            if self.writer is not None:
+                self.writer.writerow([self.frame, name, '%.4f' % ms])
+        self.current = collections.OrderedDict()
+        self.frame += 1
+
+    def averages(self):
+        '''
+        Returns:
+            averages (OrderedDict): average time of each phase over the
+                last frames, in milliseconds, in the order first seen
+        '''
+        return collections.OrderedDict(
+            (name, sum(times) / len(times))
+            for name, times in self.history.items())
+
+    def rows(self):
+        '''
+        Returns:
+            rows (list): (phase, text) pairs with the average time of the
+                whole frame and of each phase
+        '''
+        averages = self.averages()
+        frame = averages.pop('frame', 0)
+        rows = [('frame', '%.2f ms (%d fps)' % (
+            frame, round(1000 / frame) if frame else 0))]
+        for name, ms in averages.items():
+            rows.append((name, '%.2f' % ms))
+        return rows
+
+    def close(self):
+        if self.csvfile is not None:
+            self.csvfile.close()
+            self.csvfile = None
+            self.writer = None
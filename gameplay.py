@@ -32,13 +32,21 @@ class Player():
             spritenum (int): the number or index of the sprite
         '''
         self.rect = pygame.Rect(x, y, 0,0)
-        self.sprite = spritedict[spritenum][0]
-        self.hp = spritedict[spritenum][1]
-        self.damage = spritedict[spritenum][2]
-        self.speed = spritedict[spritenum][3]
+        self.sprite = spriteimages[spritenum]
+        self.hp = spritedict[spritenum][0]
+        self.damage = spritedict[spritenum][1]
+        self.speed = spritedict[spritenum][2]
 
-    def draw(self):
-        level.DISPLAY_SURFACE.blit(self.sprite, (self.rect.x, self.rect.y))
+    def draw(self, camera=None):
+        '''
+        Draw the player, through the camera if one is given.
+        Returns:
+            rect (Rect): area of the screen that was drawn
+        '''
+        if camera is not None:
+            return camera.draw_sprite(self.sprite, self.rect.topleft)
+        return level.DISPLAY_SURFACE.blit(self.sprite,
+            (self.rect.x, self.rect.y))
 
     def move(self, dx, dy, tilelist):
         '''
@@ -47,16 +55,17 @@ class Player():
         Arguments:
             dx (int): how far to move horiziontally
             dy (int): how far to move vertically
+            tilelist (TileMap): tiles of the dungeon
         '''
-        self.sprite = spritedict[0][0]
+        self.sprite = spriteimages[SASUKE]
         if self.rect.x < -1:
             self.rect.x = 1
-        elif self.rect.x > (MAP_WIDTH-2)*(TILE_SIZE):
-            self.rect.x = (MAP_WIDTH-2)*(TILE_SIZE)
+        elif self.rect.x > (tilelist.width-2)*(TILE_SIZE):
+            self.rect.x = (tilelist.width-2)*(TILE_SIZE)
         elif self.rect.y < -1:
             self.rect.y = 1
-        elif self.rect.y > (MAP_HEIGHT-2)*(TILE_SIZE):
-            self.rect.y = (MAP_HEIGHT-2)*(TILE_SIZE)
+        elif self.rect.y > (tilelist.height-2)*(TILE_SIZE):
+            self.rect.y = (tilelist.height-2)*(TILE_SIZE)
         else:
             self.rect.x += dx * self.speed
             self.rect.y -= dy * self.speed
@@ -88,73 +97,138 @@ class Player():
                 self.rect.y = tile.rect.y - TILE_SIZE
                 # print('collision')
 
-    def collision(self, enemy_list):
+    def collision(self, enemies):
         '''
         End game when player collides with enemy.
         Arguments:
-            enemy_list (list): a list of enemy objects that the function
-            will check to see whether the player is colliding with an enemy
+            enemies (SpatialHash): spatial hash of the enemy objects that
+            the function will check to see whether the player is colliding
+            with an enemy
         '''
-        for enemy in enemy_list:
-            # if self.rect.colliderect(enemy.rect):
-            if player.rect == enemy.rect:
-                print('TEST GAME OVER')
-                pygame.quit()
-                sys.exit()
-
-    def attack(self, enemy_list):
+        #only enemies at the player's exact position
+        position = pygame.Rect(self.rect.topleft, (1, 1))
+        for enemy in enemies.query_rect(position):
+            print('TEST GAME OVER')
+            pygame.quit()
+            sys.exit()
+
+    def attack(self, enemies):
         '''
         Player attacks enemy with spacebar.
+        Arguments:
+            enemies (SpatialHash): spatial hash of the enemy objects,
+            only the enemies in reach are looked at
         '''
-        for enemy in enemy_list:
-            if enemy.rect.x > self.rect.x - TILE_SIZE \
-            and enemy.rect.x < self.rect.x + 2*TILE_SIZE \
-            and enemy.rect.y > self.rect.y - TILE_SIZE \
-            and enemy.rect.y < self.rect.y + 2*TILE_SIZE:
-                punchsound.play()
-                enemy.hp -= self.damage
-                self.sprite = spritedict[-1][0]
-                if DEBUG_ENEMY:
-                    print('enemy hp: ', enemy.hp)
+        for enemy in enemies.query_rect(attackrange(self.rect)):
+            sounds.post(PUNCH)
+            enemy.hp -= self.damage
+            self.sprite = spriteimages[SASUKEATK]
+            if DEBUG_ENEMY:
+                print('enemy hp: ', enemy.hp)
 
     def died(self):
         '''
         Returns True if player's health is zero.
-        Play a sound effect and end the game.
+        Queue a sound effect and end the game.
         '''
         if self.hp <= 0:
-            self.sprite = spritedict[ITACHI][0]
-            # wait for other sounds to finish
-            while pygame.mixer.get_busy():
-                pygame.time.delay(1)
-            # play game over sound
-            gameover_snake.play()
-            # wait for gameover sound to finish
-            while pygame.mixer.get_busy():
-                pygame.time.delay(1)
+            self.sprite = spriteimages[ITACHI]
+            # play game over sound (see sounds.wait to let it finish)
+            sounds.post(GAMEOVER_SNAKE)
             return True
         return False
 
 
+def storefield(name):
+    '''
+    Property reading and writing one of the arrays of an EnemyStore
+    at the index of the enemy.
+    Arguments:
+        name (str): name of the array in the store
+    '''
+    def getfield(self):
+        return getattr(self.store, name)[self.index].item()
+
+    def setfield(self, value):
+        getattr(self.store, name)[self.index] = value
+
+    return property(getfield, setfield)
+
+
+
 class Enemy():
-    '''Class for enemy objects'''
-    def __init__(self, x, y, spritenum):
+    '''
+    Class for enemy objects.
+    Positions, stats and cooldowns live in the arrays of an EnemyStore,
+    the enemy is a view of one index of the store (plus its cached path).
+    '''
+    x = storefield('x')
+    y = storefield('y')
+    hp = storefield('hp')
+    damage = storefield('damage')
+    speed = storefield('speed')
+    ai = storefield('ai')
+    spritenum = storefield('spritenum')
+    #time since the last move and attack, in milliseconds
+    movetimer = storefield('movetimer')
+    attacktimer = storefield('attacktimer')
+
+    def __init__(self, x, y, spritenum, store=None):
         '''
         Create an enemy object.
         Arguments:
             x (int): horizontal position of enemy
             y (int): vertical position of enemy
             spritenum (int): the number or index of the sprite
+            store (EnemyStore): store to add the enemy to,
+                                a store of its own by default
         '''
-        self.rect = pygame.Rect(x, y, 0,0)
-        self.sprite = spritedict[spritenum][0]
-        self.hp = spritedict[spritenum][1]
-        self.damage = spritedict[spritenum][2]
-        self.speed = spritedict[spritenum][3]
-        self.ai = random.randint(0,AI-1)
+        if store is None:
+            store = EnemyStore(1)
+        self.store = store
+        self.index = store.add(self, x, y, spritenum, random.randint(0,AI-1))
+        #cached path to the player, reused until it has to be replanned
+        self.path = []
+        self.pathindex = 0
+        self.pathgoal = None
+        self.pathage = 0
+
+    @property
+    def rect(self):
+        '''
+        Position of the enemy as a Rect.
+        This is a copy, use moveby or assign a new rect to move the enemy.
+        '''
+        return pygame.Rect(self.x, self.y, 0,0)
+
+    @rect.setter
+    def rect(self, rect):
+        self.x = rect.x
+        self.y = rect.y
+
+    @property
+    def sprite(self):
+        return spriteimages[self.spritenum]
+
+    def moveby(self, dx, dy):
+        '''
+        Move the enemy.
+        Arguments:
+            dx (int): how far to move horizontally in pixels
+            dy (int): how far to move vertically in pixels
+        '''
+        self.store.x[self.index] += dx
+        self.store.y[self.index] += dy
 
-    def draw(self):
-        level.DISPLAY_SURFACE.blit(self.sprite, (self.rect.x, self.rect.y))
+    def draw(self, camera=None):
+        '''
+        Draw the enemy, through the camera if one is given.
+        Returns:
+            rect (Rect): area of the screen that was drawn
+        '''
+        if camera is not None:
+            return camera.draw_sprite(self.sprite, (self.x, self.y))
+        return level.DISPLAY_SURFACE.blit(self.sprite, (self.x, self.y))
 
     def generateenemy(self, x, y, sprite, speed):
         '''
@@ -167,27 +241,85 @@ class Enemy():
         '''
         x = random.randint(1, MAP_HEIGHT-1)
         y = random.randint(1, MAP_WIDTH-1)
-        sprite = spritedict[random.randint(0,numsprites-1)]
+        sprite = spriteimages[random.randint(0,numsprites-1)]
         speed = random.randint(1,3)
         newenemy = Enemy(x, y, sprite, speed)
         return newenemy
 
-    def chase_player(self, player, graph):
+    def getnextstep(self, graph, enemyloc, playerloc):
         '''
-        Method for enemy to move towards player.
+        Find the next tile the enemy should move to with its ai.
         Arguments:
-            player (class): the player object
             graph (class): an instance of one of the grid-based classes
                             used in the search algorithms
+            enemyloc (tuple): coordinates of the enemy's tile
+            playerloc (tuple): coordinates of the player's tile
+        Returns:
+            nextloc (tuple): coordinates of the next tile on the path,
+                            None if the enemy is next to the player
         '''
-        playerx = int(math.ceil(player.rect.x/TILE_SIZE))
-        playery = int(math.ceil(player.rect.y/TILE_SIZE))
-        enemyx = int(math.ceil(self.rect.x/TILE_SIZE))
-        enemyy = int(math.ceil(self.rect.y/TILE_SIZE))
-
-        playerloc = (playerx, playery)
-        enemyloc = (enemyx, enemyy)
+        if self.ai == FLOW:
+            if DEBUG_PATH:
+                print('flowfield')
+            #one search from the player shared by all enemies
+            graph.flowfield.update(playerloc)
+            nextloc = graph.flowfield.nextstep.get(enemyloc)
+            if nextloc == playerloc:
+                return None
+            return nextloc
+
+        if self.needsreplan(graph, enemyloc, playerloc):
+            self.replan(graph, enemyloc, playerloc)
+        else:
+            self.pathage += 1
+        #stop next to the player, but go all the way to the end
+        #of a path that only leads part of the way (HIERARCHICAL ai)
+        remaining = len(self.path) - self.pathindex
+        if remaining > 2 or (remaining == 2 and self.path[-1] != playerloc):
+            return self.path[self.pathindex + 1]
+        return None
+
+    def needsreplan(self, graph, enemyloc, playerloc):
+        '''
+        Check whether the cached path can still be followed.
+        Advances along the path if the enemy reached its next tile.
+        Arguments:
+            graph (class): an instance of one of the grid-based classes
+                            used in the search algorithms
+            enemyloc (tuple): coordinates of the enemy's tile
+            playerloc (tuple): coordinates of the player's tile
+        Returns:
+            replan (bool): True if the path has to be searched again
+        '''
+        #player moved to another tile or path is too old
+        if playerloc != self.pathgoal or self.pathage >= REPLAN_INTERVAL:
+            return True
+        if self.pathindex + 1 < len(self.path) \
+        and self.path[self.pathindex + 1] == enemyloc:
+            self.pathindex += 1
+        #enemy left the path
+        if self.pathindex >= len(self.path) \
+        or self.path[self.pathindex] != enemyloc:
+            return True
+        #enemy reached the end of a path that only leads part of the way
+        if self.pathindex == len(self.path) - 1 and enemyloc != playerloc:
+            return True
+        #next step became blocked
+        if self.pathindex + 1 < len(self.path) \
+        and not graph.notwall(self.path[self.pathindex + 1]):
+            return True
+        return False
 
+    def replan(self, graph, enemyloc, playerloc):
+        '''
+        Search for a new path to the player with the enemy's ai
+        and cache it.
+        Arguments:
+            graph (class): an instance of one of the grid-based classes
+                            used in the search algorithms
+            enemyloc (tuple): coordinates of the enemy's tile
+            playerloc (tuple): coordinates of the player's tile
+        '''
         if self.ai == BREADTH:
             if DEBUG_PATH:
                 print('breadthfirstsearch')
@@ -204,57 +336,430 @@ class Enemy():
             if DEBUG_PATH:
                 print('astarsearch')
             pathdict = astarsearch(graph, enemyloc, playerloc)
+        elif self.ai == JUMP:
+            if DEBUG_PATH:
+                print('jumppointsearch')
+            pathdict = jumppointsearch(graph, enemyloc, playerloc)
+        elif self.ai == HIERARCHICAL:
+            if DEBUG_PATH:
+                print('hierarchicalpath')
+            #only the tiles to the next rooms, the rest is searched
+            #once the enemy gets there
+            pathdict = None
+            self.path = hierarchicalpath(graph, enemyloc, playerloc,
+                                         REFINE_SEGMENTS)
         if DEBUG_PATH:
             print('path')
-        path = getpath(pathdict, enemyloc, playerloc)
-        if len(path) > 2:
-            if DEBUG_PATH:
-                print('moving')
-            currloc = path.pop(0)
-            nextloc = path.pop(0)
-            dir_x = np.sign(nextloc[0] - currloc[0])
-            dir_y = np.sign(nextloc[1] - currloc[1])
-            if not self.rect.colliderect(player.rect):
-                self.rect.x += dir_x * self.speed
-                self.rect.y += dir_y * self.speed
-                enemyclock.tick(enemyframes)
-
-    def attack(self, player):
-        '''
-        Enemy attacks player if in range.
-        '''
-        if player.rect.x > self.rect.x - TILE_SIZE \
-            and player.rect.x < self.rect.x + 2*TILE_SIZE \
-            and player.rect.y > self.rect.y - TILE_SIZE \
-            and player.rect.y < self.rect.y + 2*TILE_SIZE:
-                pikachu_attack.play()
-                player.hp -= self.damage
-                enemyclock.tick(enemyframes)
-                if DEBUG_PLAYER:
-                    print('player hp: ', player.hp)
+        if pathdict is not None:
+            self.path = getpath(pathdict, enemyloc, playerloc)
+        self.pathindex = 0
+        self.pathgoal = playerloc
+        self.pathage = 0
 
     def died(self):
         '''
         Returns True if enemy health is zero.
-        Play a sound effect.
+        Queue a sound effect.
         '''
         if self.hp <= 0:
-            while pygame.mixer.get_busy():
-                pygame.time.delay(1)
-            pikachu_die.play()
+            sounds.post(PIKACHU_DIE)
             return True
         return False
 
 
 
-def checkhp(enemy_list):
+class EnemyStore():
     '''
-    Check hp of all enemies and kill an enemy
-    (by deleting object instances) if its hp is 0.
+    Structure of arrays holding the enemies of a level.
+    Each field (position, stats, ai type, cooldowns) is a NumPy array with
+    one entry per enemy, so timers, movement, attacks and deaths can be
+    updated for every enemy in a single pass over the arrays.
+    The Enemy objects are views of one index each and keep working with
+    the code written for single enemies; iterating the store gives them.
+    Args:
+        capacity (int): number of enemies to allocate space for,
+                        the arrays grow when more are added
     '''
-    for enemy in enemy_list:
-        if enemy.died():
-            enemy_list.remove(enemy)
+    FIELDS = ('x', 'y', 'hp', 'damage', 'speed', 'ai', 'spritenum',
+              'movetimer', 'attacktimer')
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        #enemy views by index
+        self.enemies = []
+        for field in EnemyStore.FIELDS:
+            setattr(self, field, np.zeros(max(capacity, 1), dtype=np.int32))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        #copy, so enemies can be removed while iterating
+        return iter(list(self.enemies))
+
+    def __getitem__(self, index):
+        return self.enemies[index]
+
+    def add(self, enemy, x, y, spritenum, ai):
+        '''
+        Make room for an enemy and fill in its stats.
+        Called by Enemy, use Enemy(x, y, spritenum, store) to add one.
+        Returns:
+            index (int): index of the enemy in the arrays
+        '''
+        if self.count == len(self.x):
+            self.grow(2*len(self.x))
+        index = self.count
+        self.x[index] = x
+        self.y[index] = y
+        self.hp[index] = spritedict[spritenum][0]
+        self.damage[index] = spritedict[spritenum][1]
+        self.speed[index] = spritedict[spritenum][2]
+        self.ai[index] = ai
+        self.spritenum[index] = spritenum
+        self.movetimer[index] = 0
+        self.attacktimer[index] = 0
+        self.enemies.append(enemy)
+        self.count += 1
+        return index
+
+    def grow(self, capacity):
+        '''Reallocate the arrays with room for capacity enemies.'''
+        for field in EnemyStore.FIELDS:
+            array = np.zeros(capacity, dtype=np.int32)
+            array[:self.count] = getattr(self, field)[:self.count]
+            setattr(self, field, array)
+
+    def sweep(self):
+        '''
+        Remove every enemy whose health is zero.
+        The arrays are compacted in one pass with a mask of the living
+        enemies, which keep their order.
+        Returns:
+            dead (list): enemies that were removed
+        '''
+        n = self.count
+        alive = self.hp[:n] > 0
+        deadindices = np.flatnonzero(~alive)
+        if len(deadindices) == 0:
+            return []
+        dead = [self.enemies[index] for index in deadindices.tolist()]
+        for enemy in dead:
+            self.detach(enemy)
+        keep = np.flatnonzero(alive)
+        for field in EnemyStore.FIELDS:
+            array = getattr(self, field)
+            array[:len(keep)] = array[keep]
+        self.enemies = [self.enemies[index] for index in keep.tolist()]
+        self.count = len(keep)
+        #enemies before the first dead one did not move
+        for index in range(deadindices[0], self.count):
+            self.enemies[index].index = index
+        return dead
+
+    def detach(self, enemy):
+        '''
+        Copy an enemy that is being removed into a store of its own,
+        so it can still be read (and drawn) afterwards.
+        Arguments:
+            enemy (Enemy): enemy of this store
+        '''
+        detached = EnemyStore(1)
+        for field in EnemyStore.FIELDS:
+            getattr(detached, field)[0] = getattr(self, field)[enemy.index]
+        detached.enemies.append(enemy)
+        detached.count = 1
+        enemy.store = detached
+        enemy.index = 0
+
+    def tiles(self, indices):
+        '''
+        Arguments:
+            indices (array): indices of enemies
+        Returns:
+            tilex (array): horizontal tile coordinates of the enemies
+            tiley (array): vertical tile coordinates of the enemies
+        '''
+        #same rounding as math.ceil(x/TILE_SIZE)
+        tilex = -(-self.x[indices] // TILE_SIZE)
+        tiley = -(-self.y[indices] // TILE_SIZE)
+        return tilex, tiley
+
+    def tick(self, elapsed):
+        '''
+        Let time pass for the move and attack cooldowns of every enemy.
+        Arguments:
+            elapsed (int): time that passed in milliseconds
+        '''
+        n = self.count
+        #actions subtract the cooldown, so the time past it carries over
+        #to the next one, but a long pause does not store up actions
+        np.minimum(self.movetimer[:n] + elapsed,
+                   ENEMY_MOVE_COOLDOWN + SIMULATION_STEP,
+                   out=self.movetimer[:n])
+        np.minimum(self.attacktimer[:n] + elapsed,
+                   ENEMY_ATTACK_COOLDOWN + SIMULATION_STEP,
+                   out=self.attacktimer[:n])
+
+    def chase(self, player, graph, timings=None):
+        '''
+        Move every enemy whose move cooldown has passed one step towards
+        the player.
+        The next tile is still found by each enemy's own ai,
+        the moves are applied to all of them at once.
+        Arguments:
+            player (class): the player object
+            graph (class): an instance of one of the grid-based classes
+                            used in the search algorithms
+            timings (dict): if given, the time spent finding the next tiles
+                            is added to it by ai type, in milliseconds
+        Returns:
+            moved (list): enemies that moved
+        '''
+        ready = np.flatnonzero(self.movetimer[:self.count]
+                               >= ENEMY_MOVE_COOLDOWN)
+        if len(ready) == 0:
+            return []
+        playerloc = (int(math.ceil(player.rect.x/TILE_SIZE)),
+                     int(math.ceil(player.rect.y/TILE_SIZE)))
+        tilex, tiley = self.tiles(ready)
+        steps = np.zeros((len(ready), 2), dtype=np.int32)
+        moving = np.zeros(len(ready), dtype=bool)
+        for i, (index, enemyloc) in enumerate(
+                zip(ready.tolist(), zip(tilex.tolist(), tiley.tolist()))):
+            if timings is not None:
+                began = time.perf_counter()
+            nextloc = self.enemies[index].getnextstep(graph, enemyloc,
+                                                      playerloc)
+            if timings is not None:
+                ai = self.ai[index].item()
+                timings[ai] = timings.get(ai, 0) \
+                    + (time.perf_counter() - began) * 1000
+            if nextloc is not None:
+                steps[i] = (nextloc[0] - enemyloc[0], nextloc[1] - enemyloc[1])
+                moving[i] = True
+        ready = ready[moving]
+        steps = np.sign(steps[moving])
+        self.x[ready] += steps[:, 0] * self.speed[ready]
+        self.y[ready] += steps[:, 1] * self.speed[ready]
+        self.movetimer[ready] -= ENEMY_MOVE_COOLDOWN
+        return [self.enemies[index] for index in ready.tolist()]
+
+    def attack(self, player):
+        '''
+        Every enemy in range whose attack cooldown has passed attacks
+        the player.
+        The attack sound is queued once for all of them.
+        Arguments:
+            player (class): the player object
+        Returns:
+            hits (int): number of enemies that attacked
+        '''
+        n = self.count
+        #player's position relative to each enemy, in reach if it is
+        #less than a tile away from the enemy's tile (see attackrange)
+        dx = player.rect.x - self.x[:n]
+        dy = player.rect.y - self.y[:n]
+        attacking = np.flatnonzero(
+            (self.attacktimer[:n] >= ENEMY_ATTACK_COOLDOWN)
+            & (dx > -TILE_SIZE) & (dx < 2*TILE_SIZE)
+            & (dy > -TILE_SIZE) & (dy < 2*TILE_SIZE))
+        if len(attacking) == 0:
+            return 0
+        sounds.post(PIKACHU_ATTACK)
+        player.hp -= int(self.damage[attacking].sum())
+        self.attacktimer[attacking] -= ENEMY_ATTACK_COOLDOWN
+        if DEBUG_PLAYER:
+            print('player hp: ', player.hp)
+        return len(attacking)
+
+
+
+class FixedTimestep():
+    '''
+    Turns the time between rendered frames into a whole number of
+    fixed-length simulation steps, so enemies move and attack at the same
+    rate whatever the frame rate.
+    Leftover time is carried over to the next frame.
+    Args:
+        step (int): length of one simulation step in milliseconds
+        maxsteps (int): most steps to run for one frame,
+                        so a slow frame does not snowball
+    '''
+    def __init__(self, step, maxsteps=5):
+        self.step = step
+        self.maxsteps = maxsteps
+        self.accumulator = 0
+
+    def advance(self, elapsed):
+        '''
+        Add the time of the last frame.
+        Args:
+            elapsed (int): time since the last frame in milliseconds
+        Returns:
+            steps (int): number of simulation steps to run now
+        '''
+        self.accumulator += elapsed
+        steps = self.accumulator // self.step
+        if steps > self.maxsteps:
+            #drop the time that could not be simulated
+            steps = self.maxsteps
+            self.accumulator = 0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+
+
+def attackrange(rect):
+    '''
+    Area within reach of an attack: positions less than a tile away
+    from the attacker's tile on each side.
+    Arguments:
+        rect (Rect): rect of the attacker
+    Returns:
+        reach (Rect): positions that can be hit, for use with collidepoint
+    '''
+    return pygame.Rect(rect.x - TILE_SIZE + 1, rect.y - TILE_SIZE + 1,
+                       3*TILE_SIZE - 1, 3*TILE_SIZE - 1)
+
+
+
+class SpatialHash():
+    '''
+    Uniform grid of cells, one per tile by default, holding the entities
+    (player or enemies) whose position falls in them.
+    Proximity queries only look at the cells they overlap, so their cost
+    depends on how many entities are nearby rather than on the total.
+    Entities are located by the top left corner of their rect and have to
+    be updated after they move.
+    Args:
+        cellsize (int): width and height of a cell in pixels
+    '''
+    def __init__(self, cellsize=TILE_SIZE):
+        self.cellsize = cellsize
+        #cell: entities in the cell (a dict keeps them in insertion order)
+        self.cells = {}
+        #entity: cell it is filed under
+        self.entitycells = {}
+
+    def __len__(self):
+        return len(self.entitycells)
+
+    def __contains__(self, entity):
+        return entity in self.entitycells
+
+    def __iter__(self):
+        return iter(list(self.entitycells))
+
+    def getcell(self, x, y):
+        '''
+        Returns:
+            cell (tuple): coordinates of the cell containing pixel (x, y)
+        '''
+        return (x // self.cellsize, y // self.cellsize)
+
+    def insert(self, entity):
+        '''Add an entity at its current position.'''
+        cell = self.getcell(entity.rect.x, entity.rect.y)
+        self.cells.setdefault(cell, {})[entity] = None
+        self.entitycells[entity] = cell
+
+    def remove(self, entity):
+        '''Remove an entity, if it is in the hash.'''
+        cell = self.entitycells.pop(entity, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[entity]
+        if not bucket:
+            del self.cells[cell]
+
+    def update(self, entity):
+        '''Move an entity to the cell of its current position.'''
+        cell = self.getcell(entity.rect.x, entity.rect.y)
+        if self.entitycells.get(entity) != cell:
+            self.remove(entity)
+            self.insert(entity)
+
+    def rebuild(self, entities):
+        '''Replace the content of the hash with the given entities.'''
+        self.cells = {}
+        self.entitycells = {}
+        for entity in entities:
+            self.insert(entity)
+
+    def query_rect(self, rect):
+        '''
+        Find the entities positioned inside a rect.
+        Arguments:
+            rect (Rect): area to search, in pixels
+        Returns:
+            found (list): entities whose position collides with rect
+        '''
+        if rect.width <= 0 or rect.height <= 0:
+            return []
+        left, top = self.getcell(rect.left, rect.top)
+        right, bottom = self.getcell(rect.right - 1, rect.bottom - 1)
+        found = []
+        #walk the cells unless the area covers more cells than are filled
+        if (right - left + 1) * (bottom - top + 1) <= len(self.cells):
+            buckets = [self.cells.get((x, y))
+                       for x in range(left, right + 1)
+                       for y in range(top, bottom + 1)]
+        else:
+            buckets = [bucket for (x, y), bucket in self.cells.items()
+                       if left <= x <= right and top <= y <= bottom]
+        for bucket in buckets:
+            if bucket:
+                for entity in bucket:
+                    if rect.collidepoint(entity.rect.x, entity.rect.y):
+                        found.append(entity)
+        return found
+
+    def query_radius(self, x, y, radius):
+        '''
+        Find the entities within a distance of a point, e.g. for effects
+        that hit an area.
+        Arguments:
+            x (int): horizontal position of the center in pixels
+            y (int): vertical position of the center in pixels
+            radius (int): distance from the center in pixels
+        Returns:
+            found (list): entities at most radius away from (x, y)
+        '''
+        bounds = pygame.Rect(x - radius, y - radius,
+                             2*radius + 1, 2*radius + 1)
+        return [entity for entity in self.query_rect(bounds)
+                if (entity.rect.x - x)**2 + (entity.rect.y - y)**2
+                <= radius**2]
+
+
+
+def checkhp(enemy_list, enemies=None):
+    '''
+    Check hp of all enemies and kill the enemies whose hp is 0,
+    all in one pass.
+    The death sound is queued once for all of them.
+    Arguments:
+        enemy_list (EnemyStore or list): enemies of the level
+        enemies (SpatialHash): spatial hash to remove the killed enemies
+                            from as well
+    Returns:
+        dead (list): enemies that were killed
+    '''
+    if isinstance(enemy_list, EnemyStore):
+        dead = enemy_list.sweep()
+    else:
+        dead = [enemy for enemy in enemy_list if enemy.hp <= 0]
+        if dead:
+            enemy_list[:] = [enemy for enemy in enemy_list if enemy.hp > 0]
+    if dead:
+        sounds.post(PIKACHU_DIE)
+        if enemies is not None:
+            for enemy in dead:
+                enemies.remove(enemy)
+    return dead
 
 
 
@@ -322,12 +827,14 @@ class TileGraph():
             for row in range(MAP_HEIGHT):
                 self.edges[(col,row)] = list()
 
-    def getdungeonedges(self):
+    def getdungeonedges(self, dungeon):
         '''
         Method to fill TileGraph instance with undirected edges of a Dungeon
         instance.
         Time Complexity:
             O(2|E|)
+        Args:
+            dungeon (class): an instance of the Dungeon class
         '''
         for col in range(MAP_WIDTH-1):
             for row in range(MAP_HEIGHT-1):
@@ -353,10 +860,26 @@ class TileGraph():
         return self.edges[index]
 
 
+def getcosttable():
+    '''
+    Lookup table from tile id to the cost of stepping onto the tile,
+    so the costs of many tiles are found with one NumPy indexing.
+    Returns:
+        costtable (ndarray): costtable[tile_id] is the cost of the tile
+    '''
+    costtable = np.full(256, DEFAULT_TILE_COST, dtype=np.int32)
+    for tile_id, tilecost in tilecosts.items():
+        costtable[tile_id] = tilecost
+    return costtable
+
+
+
 class TileGrid():
     '''
     A grid-based graph class to represent tiles.
     Useful for breadthfirstsearch.
+    Walkability is kept in a bitmap and the neighbors of every tile are
+    precomputed once per level, so neighbor lookups in the searches are O(1).
     Args:
         width (int): map width
         height (int): map height
@@ -364,39 +887,77 @@ class TileGrid():
     def __init__(self, width, height):
         self.width = width
         self.height = height
-        self.walls = []
+        self.walls = set()
+        #walkable[x, y] is False for walls, every tile is walkable until
+        #getwalls (a read-only view, so it takes no memory)
+        self.walkable = np.broadcast_to(True, (width, height))
+        #adjacency[(x, y)] is the list of walkable neighbors of (x, y)
+        self.adjacency = {}
+        #paths to the player shared by all enemies using the FLOW ai
+        self.flowfield = FlowField(self)
+        #rooms and corridors used by the HIERARCHICAL ai (see getnavgraph)
+        self.navgraph = None
 
     def getwalls(self, dungeon):
         '''
-        Method to get the locations of the walls and put them into a list
-        used for wall collision detection.
+        Method to get the locations of the walls, build the walkability
+        bitmap used for wall collision detection
+        and precompute the neighbors of every tile.
         Time Complexity:
             O(|V|)
         Args:
             dungeon (class): an instance of the Dungeon class
                             used to get all the walls
         '''
-        for col in range(MAP_WIDTH):
-            for row in range(MAP_HEIGHT):
-                # currtile = dungeon.tile_map[row][col]
-                currtile = dungeon.tile_map[(col, row)]
-                # print(currtile)
-                if currtile.tile_id == WALL:
-                    self.walls.append((col,row))
+        walls = dungeon.tile_map.region(
+            pygame.Rect(0, 0, self.width, self.height)) == WALL
+        self.walkable = ~walls
+        self.walls = set(map(tuple, np.argwhere(walls).tolist()))
+
+        walkable = self.walkable.tolist()
+        self.adjacency = {}
+        for col in range(self.width):
+            for row in range(self.height):
+                results = [(col+1, row), (col, row-1),
+                           (col-1, row), (col, row+1)]
+                if (col + row) % 2 == 0: results.reverse()
+                self.adjacency[(col, row)] = \
+                    [(x, y) for (x, y) in results
+                    if 0 <= x < self.width and 0 <= y < self.height
+                    and walkable[x][y]]
+        self.flowfield = FlowField(self)
+        self.navgraph = None
+
+    def getnavgraph(self, dungeon):
+        '''
+        Method to build the graph of the rooms and corridors of a Dungeon
+        instance used by hierarchicalsearch (see NavGraph).
+        Call after getwalls, which drops it.
+        Args:
+            dungeon (class): an instance of the Dungeon class
+                            used to get the rooms
+        '''
+        self.navgraph = NavGraph(self, dungeon)
 
     def constrained(self, index):
         (x, y) = index
         return 0 <= x < self.width and 0 <= y < self.height
 
     def notwall(self, index):
-        return index not in self.walls
+        return self.constrained(index) and bool(self.walkable[index])
+
+    def cost(self, start, end):
+        #every step costs the same on an unweighted grid
+        return 1
 
     def neighbors(self, index):
-        (x, y) = index
-        results = [(x+1, y), (x, y-1), (x-1, y), (x, y+1)]
-        if (x + y) % 2 == 0: results.reverse()
-        # results = filter(self.constrained, results)
-        results = filter(self.notwall, results)
+        results = self.adjacency.get(index)
+        if results is None:
+            #tile outside of the precomputed grid
+            (x, y) = index
+            results = [(x+1, y), (x, y-1), (x-1, y), (x, y+1)]
+            if (x + y) % 2 == 0: results.reverse()
+            results = list(filter(self.notwall, results))
         return results
 
 
@@ -416,14 +977,100 @@ class WeightedTileGrid(TileGrid):
     '''
     def __init__(self, width, height):
         super().__init__(width, height)
-        self.weights = {}
+        #weights[x, y] is the cost of stepping onto tile (x, y)
+        self.weights = np.full((width, height), DEFAULT_TILE_COST,
+                               dtype=np.int32)
+
+    def getwalls(self, dungeon):
+        '''
+        Method to get the walls of a Dungeon instance (see TileGrid.getwalls)
+        and the weight of every tile from its type.
+        Time Complexity:
+            O(|V|)
+        Args:
+            dungeon (class): an instance of the Dungeon class
+                            used to get all the walls and tile types
+        '''
+        super().getwalls(dungeon)
+        #the cost table is applied to the whole map at once
+        self.weights = getcosttable()[dungeon.tile_map.region(
+            pygame.Rect(0, 0, self.width, self.height))]
+
+    def getcost(self, index):
+        return int(self.weights[index])
+
+    def setcost(self, index, tilecost):
+        '''
+        Change the cost of stepping onto a tile.
+        Args:
+            index (tuple): coordinates of the tile
+            tilecost (int): new cost of the tile
+        '''
+        self.weights[index] = tilecost
+        #shared paths were searched with the old cost, they are searched
+        #again when next used
+        self.flowfield.invalidate()
+        if self.navgraph is not None:
+            self.navgraph.updatecost(self, index)
 
     def cost(self, start, end):
-        #heuristic:give each node a weight of 1
-        #note that giving a weight of 1 makes it a breadthfirstsearch
+        #heuristic:give each node the weight of its tile type
         #use higher weights for tiles to avoid
         #and lower weights for desirable tiles
-        return self.weights.pop(end, 1)
+        #note that giving every node the same weight makes it
+        #a breadthfirstsearch
+        #a plain int, so path costs are not summed as NumPy scalars
+        return self.getcost(end)
+
+
+
+class ChunkedTileGrid(TileGrid):
+    '''
+    A weighted grid-based graph class for dungeons kept in a
+    ChunkedTileMap (see level.py).
+    Walkability and costs are read from the mapped tile ids on every
+    query instead of being kept for the whole map, so the memory used
+    does not grow with the size of the dungeon.
+    Costs are the same as in WeightedTileGrid.
+    The NumPy searches (distancefield and the batch searches) and the
+    NavGraph need the walkable bitmap of the whole map and raise a
+    ValueError with this grid.
+    Args:
+        width (int): map width
+        height (int): map height
+    '''
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        #no bitmap of the whole map, see notwall
+        self.walkable = None
+        self.tile_map = None
+        self.costtable = getcosttable()
+
+    def getwalls(self, dungeon):
+        '''
+        Method to use the tiles of a Dungeon instance.
+        Nothing is precomputed, the tiles are read when queried.
+        Args:
+            dungeon (class): an instance of the Dungeon class
+        '''
+        self.tile_map = dungeon.tile_map
+        self.flowfield = FlowField(self)
+
+    def notwall(self, index):
+        return self.constrained(index) \
+            and self.tile_map.get_id(index) != WALL
+
+    def getcost(self, index):
+        return int(self.costtable[self.tile_map.get_id(index)])
+
+    def cost(self, start, end):
+        return self.getcost(end)
+
+    def neighbors(self, index):
+        (x, y) = index
+        results = [(x+1, y), (x, y-1), (x-1, y), (x, y+1)]
+        if (x + y) % 2 == 0: results.reverse()
+        return list(filter(self.notwall, results))
 
 
 
@@ -672,6 +1319,128 @@ def astarsearch(graph, startloc, endloc):
     # return visited, pathcost
 
 
+def jump(graph, loc, direction, endloc):
+    '''
+    Move from a tile in a straight line until reaching a jump point:
+    the end tile, a tile with a forced neighbor (a side tile that the
+    shortest paths have to go around to through this tile, since the tile
+    before it on that side is a wall) or, when moving vertically, a tile
+    from which a horizontal jump reaches a jump point.
+    The tiles passed on the way are not expanded.
+    Args:
+        graph (TileGrid): instance of the grid of tiles
+        loc (tuple): coordinates of tile to jump from
+        direction (tuple): one step (dx, dy) along either axis
+        endloc (tuple): coordinates of end tile
+    Returns:
+        jumppoint (tuple): coordinates of the jump point,
+                        None if a wall is reached first
+    '''
+    (x, y) = loc
+    (dx, dy) = direction
+    notwall = graph.notwall
+    while True:
+        x += dx
+        y += dy
+        if not notwall((x, y)):
+            return None
+        if (x, y) == endloc:
+            return (x, y)
+        if dx != 0:
+            #forced neighbor above or below
+            if (notwall((x, y-1)) and not notwall((x-dx, y-1))) \
+            or (notwall((x, y+1)) and not notwall((x-dx, y+1))):
+                return (x, y)
+        else:
+            #forced neighbor left or right
+            if (notwall((x-1, y)) and not notwall((x-1, y-dy))) \
+            or (notwall((x+1, y)) and not notwall((x+1, y-dy))):
+                return (x, y)
+            #vertical jumps stop where a horizontal jump finds a jump point
+            if jump(graph, (x, y), (1, 0), endloc) is not None \
+            or jump(graph, (x, y), (-1, 0), endloc) is not None:
+                return (x, y)
+
+
+def jumppointsearch(graph, startloc, endloc):
+    '''
+    Search on the given graph with Jump Point Search (JPS),
+    A* over jump points on a 4-connected grid where every step costs the
+    same.
+    Instead of adding every neighbor to the queue, a search jumps in a
+    straight line from each expanded tile (see jump), so of the many
+    paths of the same length across an open room only one is followed
+    and the tiles in between are never expanded.
+    Does not use weights, but uses heuristic.
+    Will always find the shortest path (in number of steps).
+    Time Complexity:
+        O((|V|+2|E|)log|V|) = O(2|E|log|V|) in the worst case (a maze),
+        but expands only the jump points, few in open rooms.
+    Args:
+        graph (TileGrid): instance of the undirected graph of tiles
+        startloc (tuple): coordinates of start tile
+        endloc (tuple): coordinates of end tile
+    Returns:
+        visited (dict): dictionary with keys as destination
+                        and values as previous tile
+                        (only the tiles of the path if endloc was reached,
+                        otherwise the jump points)
+    '''
+    #note push/pop take O(logn) time for binary heaps (logn height)
+    tosearch = PriorityQueue()
+    tosearch.push(startloc, 0)
+    jumpedfrom = {}
+    jumpedfrom[startloc] = None
+    pathcost = {}
+    pathcost[startloc] = 0
+
+    while not tosearch.isempty():
+        currenttile = tosearch.pop()
+
+        #early exit (needed for Best-First Search and A*)
+        if currenttile == endloc:
+            break
+
+        (x, y) = currenttile
+        #never jump back the way the search came from
+        parent = jumpedfrom[currenttile]
+        back = None
+        if parent is not None:
+            back = ((parent[0] > x) - (parent[0] < x),
+                    (parent[1] > y) - (parent[1] < y))
+        for nexttile in graph.neighbors(currenttile):
+            direction = (nexttile[0] - x, nexttile[1] - y)
+            if direction == back:
+                continue
+            jumppoint = jump(graph, currenttile, direction, endloc)
+            if jumppoint is None:
+                continue
+            newpathcost = pathcost[currenttile] \
+            + manhattandist(currenttile, jumppoint)
+            if jumppoint not in jumpedfrom \
+            or newpathcost < pathcost[jumppoint]:
+                priority = newpathcost + manhattandist(endloc, jumppoint)
+                tosearch.push(jumppoint, priority)
+                jumpedfrom[jumppoint] = currenttile
+                pathcost[jumppoint] = newpathcost
+
+    if endloc not in jumpedfrom:
+        return jumpedfrom
+    #fill in the tiles of the straight lines between the jump points
+    visited = {}
+    visited[startloc] = None
+    currenttile = endloc
+    while currenttile != startloc:
+        prevtile = jumpedfrom[currenttile]
+        dx = (prevtile[0] > currenttile[0]) - (prevtile[0] < currenttile[0])
+        dy = (prevtile[1] > currenttile[1]) - (prevtile[1] < currenttile[1])
+        while currenttile != prevtile:
+            nexttile = (currenttile[0] + dx, currenttile[1] + dy)
+            visited[currenttile] = nexttile
+            currenttile = nexttile
+    return visited
+
+
 def getpath(pathdict, startloc, endloc):
     '''
     Get the path from a "path dictionary"
@@ -702,109 +1471,715 @@ def getpath(pathdict, startloc, endloc):
     return path
 
 
+def flowfield(graph, goalloc):
+    '''
+    Reverse Dijkstra's Algorithm from the goal tile to every reachable tile.
+    Instead of one path from a start to the goal, gives the next step
+    towards the goal from every tile at once,
+    so any number of enemies can share a single search.
+    Uses weights, but no heuristic (there is no single start to aim for).
+    Time Complexity:
+        O((|V|+2|E|)log|V|) = O(2|E|log|V|)
+    Args:
+        graph (TileGrid): instance of the undirected graph of tiles
+        goalloc (tuple): coordinates of goal tile
+    Returns:
+        nextstep (dict): dictionary with keys as tiles
+                        and values as the next tile towards goalloc
+        pathcost (dict): dictionary with keys as tiles
+                        and values as the cost of the path to goalloc
+    '''
+    tosearch = PriorityQueue()
+    tosearch.push(goalloc, 0)
+    nextstep = {}
+    nextstep[goalloc] = None
+    pathcost = {}
+    pathcost[goalloc] = 0
+    searched = set()
+
+    while not tosearch.isempty():
+        currenttile = tosearch.pop()
+        #skip stale heap entries
+        if currenttile in searched:
+            continue
+        searched.add(currenttile)
+
+        for prevtile in graph.neighbors(currenttile):
+            #path runs from prevtile to currenttile, so pay for currenttile
+            newpathcost = pathcost[currenttile] \
+            + graph.cost(prevtile, currenttile)
+            if prevtile not in pathcost or newpathcost < pathcost[prevtile]:
+                tosearch.push(prevtile, newpathcost)
+                nextstep[prevtile] = currenttile
+                pathcost[prevtile] = newpathcost
+    return nextstep, pathcost
+
+
+class FlowField():
+    '''
+    Next steps towards the player from every tile of a grid,
+    shared by all enemies that chase the player.
+    The field is only searched again when the player changes tile,
+    and each enemy reads its next step in O(1).
+    Args:
+        graph (TileGrid): instance of the undirected graph of tiles
+    '''
+    def __init__(self, graph):
+        self.graph = graph
+        self.goalloc = None
+        self.nextstep = {}
+        self.pathcost = {}
+
+    def update(self, goalloc):
+        '''
+        Search the field again if the goal moved to another tile.
+        Args:
+            goalloc (tuple): coordinates of goal tile
+        '''
+        if goalloc != self.goalloc:
+            self.goalloc = goalloc
+            self.nextstep, self.pathcost = flowfield(self.graph, goalloc)
+
+    def invalidate(self):
+        '''
+        Search the field again on the next update, even if the goal
+        did not move (e.g. after the cost of a tile changed).
+        '''
+        self.goalloc = None
+
+
+
+def distancefield(graph, sources):
+    '''
+    Breadth first search from many source tiles at once,
+    done on the whole walkability bitmap of the graph with NumPy.
+    Every iteration grows the frontier by one step in all four directions
+    with array shifts instead of visiting tiles one at a time.
+    Does not use weights or heuristic.
+    Time Complexity:
+        O(D*|V|) array operations, D being the largest distance,
+        but each operation runs in vectorized C code
+    Args:
+        graph (TileGrid): instance of the grid of tiles (walkable bitmap)
+        sources (list): list of coordinates of the source tiles
+    Returns:
+        distance (ndarray): distance[x, y] is the number of steps
+                        from (x, y) to the closest source, -1 if unreachable
+    '''
+    walkable = graph.walkable
+    if walkable is None:
+        raise ValueError('distancefield needs the walkable bitmap of the '
+                         'whole map, which %s does not keep'
+                         % type(graph).__name__)
+    distance = np.full(walkable.shape, -1, dtype=np.int32)
+    frontier = np.zeros(walkable.shape, dtype=bool)
+    for (x, y) in sources:
+        frontier[x, y] = True
+    reached = frontier.copy()
+    distance[frontier] = 0
+    grown = np.empty_like(frontier)
+
+    step = 0
+    while frontier.any():
+        step += 1
+        #shift the frontier one tile in each direction
+        grown[:] = False
+        grown[1:, :] |= frontier[:-1, :]
+        grown[:-1, :] |= frontier[1:, :]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        #keep only walkable tiles that were not reached before
+        np.logical_and(grown, walkable, out=frontier)
+        frontier &= ~reached
+        reached |= frontier
+        distance[frontier] = step
+    return distance
+
+
+def descend(distance, locs):
+    '''
+    Move every tile in locs one step down a distance field.
+    Args:
+        distance (ndarray): distance field returned by distancefield
+        locs (ndarray): array of shape (n, 2) with coordinates of tiles
+    Returns:
+        nextlocs (ndarray): array of shape (n, 2) with the next tile
+                        of each path, the same tile if it is a source
+                        or cannot reach one
+    '''
+    locs = np.asarray(locs, dtype=np.intp).reshape(-1, 2)
+    (width, height) = distance.shape
+    xs = locs[:, 0]
+    ys = locs[:, 1]
+    target = distance[xs, ys] - 1
+    nextlocs = locs.copy()
+    found = target < 0
+    for (dx, dy) in ((1, 0), (0, -1), (-1, 0), (0, 1)):
+        nxs = xs + dx
+        nys = ys + dy
+        inside = (0 <= nxs) & (nxs < width) & (0 <= nys) & (nys < height)
+        step = ~found & inside & (distance[nxs.clip(0, width - 1),
+                                           nys.clip(0, height - 1)] == target)
+        nextlocs[step, 0] += dx
+        nextlocs[step, 1] += dy
+        found |= step
+    return nextlocs
+
+
+def stepfield(distance):
+    '''
+    Next tile down a distance field for every tile of the grid at once.
+    Args:
+        distance (ndarray): distance field returned by distancefield
+    Returns:
+        nextindex (ndarray): nextindex[x, y] is the flat index
+                        (x*height + y) of the next tile from (x, y),
+                        the index of (x, y) itself if it is a source
+                        or cannot reach one
+    '''
+    (width, height) = distance.shape
+    index = np.arange(width * height).reshape(width, height)
+    nextindex = index.copy()
+    target = distance - 1
+    found = target < 0
+    neighbor = np.empty_like(distance)
+    for (dx, dy) in ((1, 0), (0, -1), (-1, 0), (0, 1)):
+        #neighbor[x, y] = distance[x + dx, y + dy], -2 off the grid
+        neighbor[:] = -2
+        neighbor[max(-dx, 0):width - max(dx, 0),
+                 max(-dy, 0):height - max(dy, 0)] = \
+            distance[max(dx, 0):width - max(-dx, 0),
+                     max(dy, 0):height - max(-dy, 0)]
+        step = ~found & (neighbor == target)
+        nextindex[step] += dx * height + dy
+        found |= step
+    return nextindex
+
+
+def batchnextsteps(graph, startlocs, endloc):
+    '''
+    Next tile of the shortest path from every start tile to the end tile,
+    found with a single distancefield search from the end tile.
+    Args:
+        graph (TileGrid): instance of the grid of tiles
+        startlocs (list): list of coordinates of start tiles
+        endloc (tuple): coordinates of end tile
+    Returns:
+        nextlocs (list): list of coordinates of the next tile for each
+                        start tile (the start tile itself if it is
+                        the end tile or cannot reach it)
+    '''
+    distance = distancefield(graph, [endloc])
+    return [tuple(loc) for loc in descend(distance, startlocs).tolist()]
+
+
+def batchpaths(graph, startlocs, endloc):
+    '''
+    Shortest paths from every start tile to the end tile,
+    found with a single distancefield search from the end tile.
+    All paths are followed down the distance field together,
+    one step per iteration.
+    Args:
+        graph (TileGrid): instance of the grid of tiles
+        startlocs (list): list of coordinates of start tiles
+        endloc (tuple): coordinates of end tile
+    Returns:
+        paths (list): list with the path from each start tile as a
+                    list of tiles from start to end (same as getpath),
+                    None if the end tile cannot be reached
+    '''
+    distance = distancefield(graph, [endloc])
+    height = distance.shape[1]
+    nextindex = stepfield(distance).ravel()
+    locs = np.asarray(startlocs, dtype=np.intp).reshape(-1, 2)
+    lengths = distance[locs[:, 0], locs[:, 1]]
+    #walk every start down the field together, tiles at the end stay put
+    steps = [locs[:, 0] * height + locs[:, 1]]
+    for step in range(lengths.max(initial=0)):
+        steps.append(nextindex[steps[-1]])
+    steps = np.stack(steps)
+    paths = []
+    for i, length in enumerate(lengths.tolist()):
+        if length < 0:
+            paths.append(None)
+        else:
+            paths.append([divmod(index, height)
+                          for index in steps[:length + 1, i].tolist()])
+    return paths
+
+
+class RegionGrid():
+    '''
+    View of a grid limited to the tiles of one region of a NavGraph,
+    so the searches can be run inside a room or corridor.
+    Everything but neighbors is passed through to the wrapped grid.
+    Args:
+        graph (TileGrid): grid to wrap
+        regions (ndarray): region of every tile (NavGraph.regions)
+        region (int): region the searches stay in
+    '''
+    def __init__(self, graph, regions, region):
+        self.graph = graph
+        self.regions = regions
+        self.region = region
+
+    def neighbors(self, index):
+        return [nexttile for nexttile in self.graph.neighbors(index)
+                if self.regions[nexttile] == self.region]
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+class NavGraph():
+    '''
+    Abstract graph of the rooms and corridors of a dungeon,
+    searched by hierarchicalsearch before any tiles are.
+    Every tile of the dungeon belongs to a region: the room it lies in
+    (doors included) or the corridor it is part of (hallway tiles
+    outside of the rooms that touch each other).
+    Portals are the tiles next to a tile of another region, like doors.
+    The portals are the nodes of the graph, its edges are the steps
+    from a portal into another region and the cheapest paths between
+    the portals of a region, which are searched when the graph is
+    built instead of on every search. When the cost of a tile changes
+    (see updatecost), only the paths of its region are searched again.
+    Since any path is made of steps between regions and paths inside
+    regions, the cheapest route over the portals is as cheap as the
+    path astarsearch finds.
+    Time Complexity:
+        O(|P||V|log|V|) to build, where |P| is the most portals of a region
+    Args:
+        graph (TileGrid): grid of the dungeon, after getwalls
+        dungeon (class): an instance of the Dungeon class
+    '''
+    def __init__(self, graph, dungeon):
+        if graph.walkable is None:
+            raise ValueError('NavGraph needs the walkable bitmap of the '
+                             'whole map, which %s does not keep'
+                             % type(graph).__name__)
+        self.dungeon = dungeon
+        width, height = graph.walkable.shape
+        #tiles inside of the dungeon (void tiles are not walls but
+        #can never be reached)
+        passable = graph.walkable & (dungeon.tile_map.region(
+            pygame.Rect(0, 0, width, height)) != VOID)
+        #regions[x, y] is the region of tile (x, y), -1 if it has none
+        self.regions = np.full((width, height), -1, dtype=np.int32)
+        for region, room in enumerate(dungeon.rooms):
+            area = (slice(room.x, room.x + room.width),
+                    slice(room.y, room.y + room.height))
+            self.regions[area][passable[area]] = region
+        #corridors are the connected hallway tiles left
+        self.count = len(dungeon.rooms)
+        for loc in np.argwhere(passable & (self.regions < 0)).tolist():
+            loc = tuple(loc)
+            if self.regions[loc] >= 0:
+                continue
+            self.regions[loc] = self.count
+            tosearch = collections.deque([loc])
+            while tosearch:
+                currenttile = tosearch.popleft()
+                for nexttile in graph.neighbors(currenttile):
+                    if passable[nexttile] and self.regions[nexttile] < 0:
+                        self.regions[nexttile] = self.count
+                        tosearch.append(nexttile)
+            self.count += 1
+
+        #portals are on either side of two regions next to each other
+        regions = self.regions
+        portal = np.zeros((width, height), dtype=bool)
+        horz = (regions[:-1] != regions[1:]) \
+            & (regions[:-1] >= 0) & (regions[1:] >= 0)
+        portal[:-1] |= horz
+        portal[1:] |= horz
+        vert = (regions[:, :-1] != regions[:, 1:]) \
+            & (regions[:, :-1] >= 0) & (regions[:, 1:] >= 0)
+        portal[:, :-1] |= vert
+        portal[:, 1:] |= vert
+        #portals[region] is the list of portals of a region
+        self.portals = {}
+        #steps[portal] is the list of (portal of another region, cost)
+        #next to a portal
+        self.steps = {}
+        #edges[portal] is the list of (next portal, cost) of a portal:
+        #its steps followed by the paths to the portals of its region
+        self.edges = {}
+        #paths[(portal, portal)] is the path between two portals of a
+        #region, kept once refine searched it
+        self.paths = {}
+        #regions whose paths have to be searched again (see updatecost)
+        self.dirty = set()
+        for loc in np.argwhere(portal).tolist():
+            loc = tuple(loc)
+            region = int(regions[loc])
+            self.portals.setdefault(region, []).append(loc)
+            self.steps[loc] = [
+                (nexttile, graph.cost(loc, nexttile))
+                for nexttile in graph.neighbors(loc)
+                if regions[nexttile] >= 0 and regions[nexttile] != region]
+        for region in self.portals:
+            self.linkregion(graph, region)
+
+    def linkregion(self, graph, region):
+        '''
+        Search the cheapest paths between the portals of a region
+        and set the edges of its portals.
+        Args:
+            graph (TileGrid): grid of the dungeon
+            region (int): region to link
+        '''
+        portals = self.portals.get(region, [])
+        for loc in portals:
+            pathcost = self.regioncosts(graph, loc)
+            self.edges[loc] = self.steps[loc] + [
+                (otherloc, pathcost[otherloc]) for otherloc in portals
+                if otherloc != loc and otherloc in pathcost]
+            for otherloc in portals:
+                self.paths.pop((loc, otherloc), None)
+
+    def updatecost(self, graph, index):
+        '''
+        Take a change of the cost of stepping onto a tile into account.
+        The steps onto the tile from the portals of the regions next to
+        it are updated at once, the paths of the region of the tile are
+        searched again on the next route.
+        Args:
+            graph (TileGrid): grid of the dungeon, with the new cost
+            index (tuple): coordinates of the tile
+        '''
+        region = self.getregion(index)
+        if region < 0:
+            return
+        if region in self.portals:
+            self.dirty.add(region)
+        if index not in self.steps:
+            return
+        #the steps come first in the edges of a portal
+        for loc in graph.neighbors(index):
+            if loc not in self.steps or self.getregion(loc) == region:
+                continue
+            steps = [(nexttile, graph.cost(loc, nexttile)
+                      if nexttile == index else stepcost)
+                     for nexttile, stepcost in self.steps[loc]]
+            self.steps[loc] = steps
+            self.edges[loc][:len(steps)] = steps
+
+    def getregion(self, index):
+        '''
+        Args:
+            index (tuple): coordinates of a tile
+        Returns:
+            region (int): region of the tile, -1 if it has none
+        '''
+        (x, y) = index
+        width, height = self.regions.shape
+        if 0 <= x < width and 0 <= y < height:
+            return int(self.regions[index])
+        return -1
+
+    def regioncosts(self, graph, loc, reverse=False, targets=None):
+        '''
+        Dijkstra's Algorithm from a tile to every tile of its region,
+        without leaving the region.
+        Args:
+            graph (TileGrid): grid of the dungeon
+            loc (tuple): coordinates of the tile
+            reverse (bool): give the costs of the paths to the tile
+                            instead of from it (see flowfield)
+            targets (list): stop once the costs of these tiles are final,
+                            None to search the whole region
+        Returns:
+            pathcost (dict): dictionary with keys as tiles of the region
+                            and values as the cost of their path
+                            (final for the targets, or for all tiles
+                            without them)
+        '''
+        regiongrid = RegionGrid(graph, self.regions, self.getregion(loc))
+        tosearch = PriorityQueue()
+        tosearch.push(loc, 0)
+        pathcost = {}
+        pathcost[loc] = 0
+        searched = set()
+        remaining = None if targets is None else set(targets)
+
+        while not tosearch.isempty():
+            currenttile = tosearch.pop()
+            #skip stale heap entries
+            if currenttile in searched:
+                continue
+            searched.add(currenttile)
+            #early exit once every target is reached
+            if remaining is not None:
+                remaining.discard(currenttile)
+                if not remaining:
+                    break
+
+            for nexttile in regiongrid.neighbors(currenttile):
+                if reverse:
+                    stepcost = graph.cost(nexttile, currenttile)
+                else:
+                    stepcost = graph.cost(currenttile, nexttile)
+                newpathcost = pathcost[currenttile] + stepcost
+                if nexttile not in pathcost or newpathcost < pathcost[nexttile]:
+                    tosearch.push(nexttile, newpathcost)
+                    pathcost[nexttile] = newpathcost
+        return pathcost
+
+    def route(self, graph, startloc, endloc):
+        '''
+        A* search over the portals from the start tile to the end tile.
+        The start and end tiles are linked to the portals of their regions
+        for this search only.
+        Args:
+            graph (TileGrid): grid of the dungeon
+            startloc (tuple): coordinates of start tile
+            endloc (tuple): coordinates of end tile
+        Returns:
+            waypoints (list): startloc, the portals to go through and endloc,
+                            None if either tile has no region
+                            or endloc cannot be reached
+        '''
+        #regions whose tile costs changed since the last route
+        for region in self.dirty:
+            self.linkregion(graph, region)
+        self.dirty.clear()
+        startregion = self.getregion(startloc)
+        endregion = self.getregion(endloc)
+        if startregion < 0 or endregion < 0:
+            return None
+        startportals = self.portals.get(startregion, [])
+        endportals = self.portals.get(endregion, [])
+        if startregion == endregion:
+            startcosts = self.regioncosts(graph, startloc,
+                                          targets=startportals + [endloc])
+        else:
+            startcosts = self.regioncosts(graph, startloc,
+                                          targets=startportals)
+        endcosts = self.regioncosts(graph, endloc, reverse=True,
+                                    targets=endportals)
+        startedges = [(loc, startcosts[loc]) for loc in startportals
+                      if loc != startloc and loc in startcosts]
+        if startregion == endregion and endloc in startcosts:
+            startedges.append((endloc, startcosts[endloc]))
+
+        tosearch = PriorityQueue()
+        tosearch.push(startloc, 0)
+        visited = {}
+        visited[startloc] = None
+        pathcost = {}
+        pathcost[startloc] = 0
+
+        while not tosearch.isempty():
+            currenttile = tosearch.pop()
+            if currenttile == endloc:
+                break
+
+            edges = self.edges.get(currenttile, [])
+            if currenttile == startloc:
+                edges = edges + startedges
+            if currenttile in endcosts and currenttile != endloc:
+                edges = edges + [(endloc, endcosts[currenttile])]
+            for nexttile, edgecost in edges:
+                newpathcost = pathcost[currenttile] + edgecost
+                if nexttile not in visited or newpathcost < pathcost[nexttile]:
+                    priority = newpathcost + manhattandist(endloc, nexttile)
+                    tosearch.push(nexttile, priority)
+                    visited[nexttile] = currenttile
+                    pathcost[nexttile] = newpathcost
+        if endloc not in visited:
+            return None
+        return getpath(visited, startloc, endloc)
+
+    def refine(self, graph, startloc, endloc):
+        '''
+        Tiles between two waypoints of a route: an A* search that stays
+        in their region, or a single step from one region into another.
+        Paths between two portals are kept for the next routes.
+        Args:
+            graph (TileGrid): grid of the dungeon
+            startloc (tuple): coordinates of start waypoint
+            endloc (tuple): coordinates of end waypoint
+        Returns:
+            path (list): list of tiles from start to end
+        '''
+        region = self.getregion(startloc)
+        if region != self.getregion(endloc):
+            return [startloc, endloc]
+        path = self.paths.get((startloc, endloc))
+        if path is None:
+            regiongrid = RegionGrid(graph, self.regions, region)
+            path = getpath(astarsearch(regiongrid, startloc, endloc),
+                           startloc, endloc)
+            #paths between portals are the same for every route
+            if startloc in self.edges and endloc in self.edges:
+                self.paths[(startloc, endloc)] = path
+        return path
+
+
+def hierarchicalpath(graph, startloc, endloc, segments=None):
+    '''
+    Hierarchical pathfinding (HPA*) over the rooms and corridors of the
+    dungeon: finds the portals to go through with NavGraph.route,
+    then searches the tiles of only the first segments of that route
+    (a segment goes from one waypoint of the route to the next).
+    The tiles expanded are those of the regions of the start and end tiles
+    and of the refined segments instead of everything around the path.
+    Falls back to astarsearch if the graph has no NavGraph
+    (see TileGrid.getnavgraph) or a tile is outside of the dungeon.
+    Args:
+        graph (TileGrid): instance of the grid of tiles
+        startloc (tuple): coordinates of start tile
+        endloc (tuple): coordinates of end tile
+        segments (int): number of segments to refine, None for all of them
+    Returns:
+        path (list): list of tiles from start to end (same as getpath),
+                    ending before endloc if not all segments were refined
+    '''
+    navgraph = graph.navgraph
+    waypoints = None
+    if navgraph is not None:
+        waypoints = navgraph.route(graph, startloc, endloc)
+    if waypoints is None:
+        return getpath(astarsearch(graph, startloc, endloc), startloc, endloc)
+    legs = list(zip(waypoints, waypoints[1:]))
+    if segments is not None:
+        legs = legs[:segments]
+    path = [startloc]
+    for currenttile, nexttile in legs:
+        path.extend(navgraph.refine(graph, currenttile, nexttile)[1:])
+    return path
+
+
+def hierarchicalsearch(graph, startloc, endloc):
+    '''
+    Search on the given graph with hierarchicalpath,
+    refining the whole route.
+    Will always find the shortest path (in terms of weight).
+    Args:
+        graph (WeightedTileGrid): instance of the undirected graph of tiles
+        startloc (tuple): coordinates of start tile
+        endloc (tuple): coordinates of end tile
+    Returns:
+        visited (dict): dictionary with keys as destination
+                        and values as previous tile
+                        (only the tiles of the path)
+    '''
+    path = hierarchicalpath(graph, startloc, endloc)
+    visited = {}
+    visited[startloc] = None
+    for prevtile, nexttile in zip(path, path[1:]):
+        visited[nexttile] = prevtile
+    return visited
+
+
+def run_demo():
+    '''
+    Demo of the player, an enemy and the search algorithms in a small
+    dungeon with two hand-placed rooms.
+    Set RUN_PATH_TESTS to print the paths found by every search.
+    Run with "python3 gameplay.py".
+    '''
+    dungeon = level.Dungeon()
+
+    room1 = level.Room(0,0,6,6)
+    dungeon.rooms.append(room1)
+    room1.write(dungeon.tile_map)
+
+    room2 = level.Room(10,10,6,6)
+    dungeon.rooms.append(room2)
+    room2.write(dungeon.tile_map)
+
+    # start = (5, 3)
+    # end = (13, 10)
+    # hallway = level.Hallway(start, end)
+    # dungeon.hallways.append(hallway)
+    dungeon.connect_rooms(room1, room2)
+    # dungeon.update_tilemap(hallway.get_path() + hallway.get_border())
+    # hallway.draw()
+
+    # dungeon.add_hallway()
 
+    player = Player(1, 1, 0)
+    enemy1 = Enemy(360, 360, 1)
+    allenemies = [enemy1]
 
+    # tilegraph = TileGraph()
+    # tilegraph.getdungeonedges(dungeon)
+    # print(tilegraph.edges)
 
-pygame.init()
-
-dungeon = level.Dungeon()
-
-room1 = level.Room(0,0,6,6)
-dungeon.rooms.append(room1)
-dungeon.tile_map.update(room1.get_tile_dict())
-room1.draw()
-
-room2 = level.Room(10,10,6,6)
-dungeon.rooms.append(room2)
-dungeon.tile_map.update(room2.get_tile_dict())
-room2.draw()
-
-# start = (5, 3)
-# end = (13, 10)
-# hallway = level.Hallway(start, end)
-# dungeon.hallways.append(hallway)
-dungeon.connect_rooms(room1, room2)
-# dungeon.update_tilemap(hallway.get_path() + hallway.get_border())
-# hallway.draw()
-
-# dungeon.add_hallway()
-
-player = Player(1, 1, 0)
-enemy1 = Enemy(360, 360, 1)
-allenemies = [enemy1]
-
-# tilegraph = TileGraph()
-# tilegraph.getdungeonedges()
-# print(tilegraph.edges)
-
-# tilegrid = TileGrid(30,20)
-# tilegrid.getwalls()
-# print(tilegrid.walls)
-
-wtgrid = WeightedTileGrid(MAP_WIDTH,MAP_HEIGHT)
-wtgrid.getwalls(dungeon)
-# print(wtgrid.walls)
-
-if RUN_PATH_TESTS:
-
-    print('depthfirstsearch')
-    pathdict = depthfirstsearch(wtgrid, (1,1), (12,12))
-    # print(pathdict) way too long
-    print('depthfirstsearch path')
-    print(getpath(pathdict, (1,1), (12,12)))
-
-    print('breadthfirstsearch')
-    pathdict = breadthfirstsearch(wtgrid, (1,1), (12,12))
-    print(pathdict)
-    print('breadthfirstsearch path')
-    print(getpath(pathdict, (1,1), (12,12)))
-
-    print('dijkstra')
-    pathdict = dijkstra(wtgrid, (1,1), (12,12))
-    print(pathdict)
-    print('dijkstra path')
-    print(getpath(pathdict, (1,1), (12,12)))
-
-    print('bestfirstsearch')
-    pathdict = bestfirstsearch(wtgrid, (1,1), (12,12))
-    print(pathdict)
-    print('bestfirstsearch path')
-    print(getpath(pathdict, (1,1), (12,12)))
-
-    print('astarsearch')
-    pathdict = astarsearch(wtgrid, (1,1), (12,12))
-    print(pathdict)
-    print('astarsearch path')
-    print(getpath(pathdict, (1,1), (12,12)))
-
-print('AI type: ', aidict[enemy1.ai])
-
-# while True:
-#     dungeon.draw((dungeon.width,), (dungeon.height,))
-#
-#     player.draw()
-#     for enemy in allenemies:
-#         enemy.draw()
-#
-#     for event in pygame.event.get():
-#         if event.type == QUIT:
-#             pygame.quit()
-#             sys.exit()
-#
-#     enemy1.chase_player(player, wtgrid)
-#     player.collision(allenemies)
-#
-#     # print(dungeon.tile_map)
-#
-#     keys_pressed = pygame.key.get_pressed()
-#     if keys_pressed[K_LEFT]:
-#         player.move(-1,0,dungeon.tile_map)
-#     if keys_pressed[K_RIGHT]:
-#         player.move(1,0,dungeon.tile_map)
-#     if keys_pressed[K_UP]:
-#         player.move(0,1,dungeon.tile_map)
-#     if keys_pressed[K_DOWN]:
-#         player.move(0,-1,dungeon.tile_map)
-#
-#     pygame.display.update()
-# fpsClock.tick(FPS)
+    # tilegrid = TileGrid(30,20)
+    # tilegrid.getwalls()
+    # print(tilegrid.walls)
+
+    wtgrid = WeightedTileGrid(MAP_WIDTH,MAP_HEIGHT)
+    wtgrid.getwalls(dungeon)
+    # print(wtgrid.walls)
+
+    if RUN_PATH_TESTS:
+
+        print('depthfirstsearch')
+        pathdict = depthfirstsearch(wtgrid, (1,1), (12,12))
+        # print(pathdict) way too long
+        print('depthfirstsearch path')
+        print(getpath(pathdict, (1,1), (12,12)))
+
+        print('breadthfirstsearch')
+        pathdict = breadthfirstsearch(wtgrid, (1,1), (12,12))
+        print(pathdict)
+        print('breadthfirstsearch path')
+        print(getpath(pathdict, (1,1), (12,12)))
+
+        print('dijkstra')
+        pathdict = dijkstra(wtgrid, (1,1), (12,12))
+        print(pathdict)
+        print('dijkstra path')
+        print(getpath(pathdict, (1,1), (12,12)))
+
+        print('bestfirstsearch')
+        pathdict = bestfirstsearch(wtgrid, (1,1), (12,12))
+        print(pathdict)
+        print('bestfirstsearch path')
+        print(getpath(pathdict, (1,1), (12,12)))
+
+        print('astarsearch')
+        pathdict = astarsearch(wtgrid, (1,1), (12,12))
+        print(pathdict)
+        print('astarsearch path')
+        print(getpath(pathdict, (1,1), (12,12)))
+
+    print('AI type: ', aidict[enemy1.ai])
+
+    # while True:
+    #     dungeon.draw((dungeon.width,), (dungeon.height,))
+    #
+    #     player.draw()
+    #     for enemy in allenemies:
+    #         enemy.draw()
+    #
+    #     for event in pygame.event.get():
+    #         if event.type == QUIT:
+    #             pygame.quit()
+    #             sys.exit()
+    #
+    #     enemy1.store.chase(player, wtgrid)
+    #     player.collision(allenemies)
+    #
+    #     # print(dungeon.tile_map)
+    #
+    #     keys_pressed = pygame.key.get_pressed()
+    #     if keys_pressed[K_LEFT]:
+    #         player.move(-1,0,dungeon.tile_map)
+    #     if keys_pressed[K_RIGHT]:
+    #         player.move(1,0,dungeon.tile_map)
+    #     if keys_pressed[K_UP]:
+    #         player.move(0,1,dungeon.tile_map)
+    #     if keys_pressed[K_DOWN]:
+    #         player.move(0,-1,dungeon.tile_map)
+    #
+    #     pygame.display.update()
+    # clock.tick(FPS)
+
+
+if __name__ == '__main__':
+    run_demo()
@@ -6,21 +6,19 @@ import pygame.mixer
 
 import level
 import level_constants
+from level_constants import assets, AssetMap
+from audio import SoundManager
 
 #set framerate
 FPS = 30
 enemyframes = 20
-fpsClock = pygame.time.Clock()
-enemyclock = pygame.time.Clock()
-
-#load images for sprites
-sasuke = pygame.image.load("assets/images/sasuke0.png").convert_alpha()
-sasukeatk = pygame.image.load("assets/images/sasuke1.png").convert_alpha()
-sprite0 = pygame.image.load("assets/images/calvin.png").convert_alpha()
-sprite1 = pygame.image.load("assets/images/pikachu.png").convert_alpha()
-anbum = pygame.image.load("assets/images/anbum.png").convert_alpha()
-anbuf = pygame.image.load("assets/images/anbuf.png").convert_alpha()
-itachi = pygame.image.load("assets/images/itachi0.png").convert_alpha()
+#single time source for rendering and the simulation
+clock = pygame.time.Clock()
+#length of one fixed simulation step in milliseconds
+SIMULATION_STEP = 1000 // FPS
+#time an enemy waits between two moves and between two attacks (ms)
+ENEMY_MOVE_COOLDOWN = 1000 // enemyframes
+ENEMY_ATTACK_COOLDOWN = 1000 // enemyframes
 
 #numerical constants to represent sprites
 numsprites = 3
@@ -30,35 +28,91 @@ PIKACHU = 1
 CALVIN = 2
 ITACHI = 3
 
+#images of sprites (loaded on first use)
+spriteimages = AssetMap(assets.image, {
+    SASUKEATK: "assets/images/sasuke1.png",
+    SASUKE: "assets/images/sasuke0.png",
+    PIKACHU: "assets/images/pikachu.png",
+    CALVIN: "assets/images/calvin.png",
+    ITACHI: "assets/images/itachi0.png"
+}, alpha=True)
+
 #dictionary to represent sprites
-#values: image,hp,damage,speed
+#values: hp,damage,speed
 spritedict = {
-    SASUKEATK: (sasukeatk,100,25,25),
-    SASUKE: (sasuke,100,25,25),
-    PIKACHU: (sprite1,100,1,5),
-    CALVIN: (sprite0,100,2,3),
-    ITACHI: (itachi, 100,25,25)
+    SASUKEATK: (100,25,25),
+    SASUKE: (100,25,25),
+    PIKACHU: (100,1,5),
+    CALVIN: (100,2,3),
+    ITACHI: (100,25,25)
 }
 
 # ai constants
-AI = 4 #actually 5 if dfs included
+AI = 7 #actually 8 if dfs included
 BREADTH = 0
 DIJKSTRA = 1
 BEST = 2
 ASTAR = 3
+FLOW = 4
+HIERARCHICAL = 5
+JUMP = 6
 aidict = {
     BREADTH: 'Breadth-First Search',
     DIJKSTRA: 'Dijkstra\'s Algorithm',
     BEST: 'Best-First Search',
-    ASTAR: 'A* Search'
+    ASTAR: 'A* Search',
+    FLOW: 'Flow Field',
+    HIERARCHICAL: 'Hierarchical A* Search',
+    JUMP: 'Jump Point Search'
+}
+
+#cost of stepping onto each type of tile for the weighted searches
+#tiles not listed cost DEFAULT_TILE_COST (walls are never stepped onto)
+#costs must stay at least 1 for the manhattandist heuristic to be admissible
+DEFAULT_TILE_COST = 2
+tilecosts = {
+    level_constants.GRASS: 4,
+    level_constants.DOOR: 1
+}
+
+#number of moves an enemy follows a cached path before searching again
+REPLAN_INTERVAL = 30
+#number of segments of a hierarchical route (from one room or corridor
+#to the next) searched tile by tile at once by the HIERARCHICAL ai
+REFINE_SEGMENTS = 2
+
+#numerical constants to represent sound effects
+PUNCH = 0
+GAMEOVER = 1
+GAMEOVER_SNAKE = 2
+PIKACHU_ATTACK = 3
+PIKACHU_DIE = 4
+
+#sound effects (loaded on first use)
+soundeffects = AssetMap(assets.sound, {
+    PUNCH: "assets/soundfx/strongpunch.wav",
+    GAMEOVER: "assets/soundfx/gameover.wav",
+    GAMEOVER_SNAKE: "assets/soundfx/gameover_snake.wav",
+    PIKACHU_ATTACK: "assets/soundfx/pikachu_attack.wav",
+    PIKACHU_DIE: "assets/soundfx/pikachu_die.wav"
+})
+
+#priority of each sound effect when the mixer channels are all busy
+soundpriorities = {
+    PUNCH: 1,
+    PIKACHU_ATTACK: 0,
+    PIKACHU_DIE: 2,
+    GAMEOVER: 3,
+    GAMEOVER_SNAKE: 3
 }
+#mixer channels used for sound effects
+SOUND_CHANNELS = 8
+#shortest time between two plays of the same sound effect (ms)
+SOUND_INTERVAL = 100
 
-#sound effects
-punchsound = pygame.mixer.Sound("assets/soundfx/strongpunch.wav")
-gameover = pygame.mixer.Sound("assets/soundfx/gameover.wav")
-gameover_snake = pygame.mixer.Sound("assets/soundfx/gameover_snake.wav")
-pikachu_attack = pygame.mixer.Sound("assets/soundfx/pikachu_attack.wav")
-pikachu_die = pygame.mixer.Sound("assets/soundfx/pikachu_die.wav")
+#queue of sound effects, played once per frame (see audio.py)
+sounds = SoundManager(soundeffects, soundpriorities, SOUND_CHANNELS,
+                      SOUND_INTERVAL, level_constants.HEADLESS)
 
 #music/songs
 song1 = "assets/music/NowYou'reaHero.mp3"
@@ -0,0 +1,75 @@
+# Stand-ins for the pygame display and mixer.
+# Used instead of the real ones when the game runs headless
+# (see HEADLESS in level_constants.py), so dungeon generation, pathfinding
+# and the simulation can run without opening a window or an audio device,
+# for example in batch jobs and benchmarks.
+
+#modules/libraries
+import pygame
+
+
+class NullSurface():
+    '''
+    Surface that keeps its size but draws nothing.
+    Blits and fills return the rect they would have changed,
+    like a pygame Surface does.
+    Args:
+        size (tuple): width and height of the surface in pixels
+    '''
+    def __init__(self, size=(0, 0)):
+        self.size = tuple(size)
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        if area is not None:
+            size = pygame.Rect(area).size
+        else:
+            size = source.get_size()
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        return pygame.Rect(dest, size).clip(self.get_rect())
+
+    def fill(self, color, rect=None, special_flags=0):
+        if rect is None:
+            return self.get_rect()
+        return pygame.Rect(rect).clip(self.get_rect())
+
+    def scroll(self, dx=0, dy=0):
+        pass
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.size)
+        for attribute, value in kwargs.items():
+            setattr(rect, attribute, value)
+        return rect
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def convert(self, *args):
+        return self
+
+    def convert_alpha(self, *args):
+        return self
+
+    def copy(self):
+        return NullSurface(self.size)
+
+
+class NullSound():
+    '''
+    Sound that never plays.
+    '''
+    def play(self, *args, **kwargs):
+        return None
+
+    def stop(self):
+        pass
+
+    def get_length(self):
+        return 0
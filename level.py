@@ -1,10 +1,11 @@
 import pygame
 from pygame.locals import *
-import sys
 import random
+import bisect
+import collections
+import numpy as np
 
 from level_constants import *
-sys.setrecursionlimit(30000)
 
 # Modifies behaviour of Dungeon Generator
 # Enabling this parameter makes dungeon more populated
@@ -32,70 +33,72 @@ DEBUG_CONNECT = False
 # hallway's path
 CHANCE_GEN_GRASS = 0.3
 
-class Tile(pygame.sprite.Sprite):
-    """ A class used to represent a tile
-
-        A tile is a square in space with position (x, y) consisting
-        of an id which denotes its type (ex. grass, floor).
-        Each tile also has an image (based on tile id) and surface which it
-        is displayed on.
+class TileView():
+    """ A lightweight handle to a single position within a TileMap
 
+        A tile view has the attributes and methods of a tile (tile_id,
+        get_id, set_id, image, draw) but does not store a tile id of its
+        own. Every read and write goes through to the array of the
+        TileMap it was obtained from, so changing the id of a view changes
+        the dungeon.
     """
-    def __init__(self, tile_id, x, y):
-        """ Creates new tile object
+    def __init__(self, tile_map, x, y):
+        """ Creates new view of a tile within a tile map
 
             Arguments:
-                tile_id (int): integer that represents the type of the tile,
-                    default defined in constants file
-                x (int): horiziontal position of topleft corner
-                y (int): vertical position of topleft corner
+                tile_map (TileMap): tile map that owns the tile
+                x (int): horiziontal position of the tile
+                y (int): vertical position of the tile
         """
-        # Call baseclass constructor
-        super(Tile, self).__init__()
-
-        # Init
-        self.tile_id = tile_id
+        self.tile_map = tile_map
         self.x = x
         self.y = y
-        self.image = tile_images.get(self.tile_id)
-        self.screen = pygame.display.get_surface()
-        #for collisions
-        if tile_id == WALL:
-            self.rect = \
-                pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, TILE_SIZE, TILE_SIZE)
-        #no collision
-        else:
-            self.rect = pygame.Rect(x*TILE_SIZE, y*TILE_SIZE, 0, 0)
+
+    @property
+    def tile_id(self):
+        return self.tile_map.get_id((self.x, self.y))
+
+    @property
+    def image(self):
+        return tile_images.get(self.tile_id)
+
+    @property
+    def rect(self):
+        # Only walls have a size, for collisions
+        if self.tile_id == WALL:
+            return pygame.Rect(self.x*TILE_SIZE, self.y*TILE_SIZE,
+                TILE_SIZE, TILE_SIZE)
+        return pygame.Rect(self.x*TILE_SIZE, self.y*TILE_SIZE, 0, 0)
 
     def get_id(self):
         """ Obtains id of tile
 
             Returns:
-                self.tile_id (int): tile id of instance of Tile
+                tile_id (int): tile id stored in the tile map
         """
         return self.tile_id
 
     def set_id(self, new_id):
-        """ Changes id (and corresponding image) of tile
+        """ Changes id of tile within the tile map
 
             Arguments:
-                new_id (int): new id of instance of tile class
+                new_id (int): new id of the tile
         """
-        self.tile_id = new_id
-        self.image = tile_images.get(self.tile_id)
+        self.tile_map.set_id((self.x, self.y), new_id)
 
     def get_image(self):
-        """ Gets image associated with instance of Tile
+        """ Gets image associated with the tile
 
             Returns:
-                self.image (Pygame Surface): surface corresponding to the
+                image (Pygame Surface): surface corresponding to the
                     tile's image
         """
         return self.image
 
     def draw(self):
         """ Draws Tile onto the screen """
-        self.screen.blit(self.image, (self.x*TILE_SIZE, self.y*TILE_SIZE))
+        self.tile_map.screen.blit(self.image,
+            (self.x*TILE_SIZE, self.y*TILE_SIZE))
 
     def __str__(self):
         return "Tile: ({}, {}, {})".format(self.tile_id, self.x, self.y)
@@ -105,12 +108,405 @@ class Tile(pygame.sprite.Sprite):
             and self.x == other.x and self.y == other.y
 
     def __hash__(self):
-        # Had to implement this after overriding __eq__ in order to have sets
-        # of tiles
         return hash((self.tile_id, self.x, self.y))
 
 
-class Room(pygame.sprite.Group):
+class TileMap():
+    """ A compact grid of tile ids
+
+        The tile map stores one byte per tile in a NumPy array indexed by
+        [x, y], which is the single source of truth for the tiles of a
+        dungeon. Indexing the map with an (x, y) tuple returns a TileView,
+        no object is kept per tile.
+
+        Only the tiles within the view (the part of the map shown on
+        screen) are pre-rendered, so the cost of rendering depends on the
+        size of the window rather than the size of the map.
+    """
+    def __init__(self, width, height, tile_id=VOID):
+        """ Creates new tile map filled with a single type of tile
+
+            Arguments:
+                width (int): number of tiles horizontally
+                height (int): number of tiles vertically
+                tile_id (int): id every tile starts with, default VOID
+        """
+        self.width = width
+        self.height = height
+        self.screen = DISPLAY_SURFACE
+        self.ids = np.full((width, height), tile_id, dtype=np.uint8)
+        # Tiles shown on screen, at most a window's worth from the topleft
+        self.view = pygame.Rect(0, 0,
+            min(width, VIEW_WIDTH), min(height, VIEW_HEIGHT))
+        # Pre-rendered image of the view, patched whenever a tile changes
+        self.background = None
+        # Areas of the background patched since the last redraw
+        self.dirty = []
+
+    def in_bounds(self, pos):
+        """ Checks whether a position lies within the map
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position
+
+            Returns:
+                in_bounds (bool): True if position is within the map
+        """
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def get_id(self, pos):
+        """ Obtains id of tile at a position
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position of tile
+
+            Returns:
+                tile_id (int): id of tile at pos
+        """
+        if not self.in_bounds(pos):
+            raise KeyError(pos)
+        return int(self.ids[pos[0], pos[1]])
+
+    def set_id(self, pos, new_id):
+        """ Changes id of tile at a position
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position of tile
+                new_id (int): new id of tile
+        """
+        if not self.in_bounds(pos):
+            raise KeyError(pos)
+        if self.background is not None \
+            and self.view.collidepoint(pos) \
+            and self.get_id(pos) != new_id:
+            rect = pygame.Rect((pos[0] - self.view.x)*TILE_SIZE,
+                (pos[1] - self.view.y)*TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            self.background.blit(tile_images.get(new_id), rect)
+            self.dirty.append(rect)
+        self.store_id(pos, new_id)
+
+    def store_id(self, pos, new_id):
+        """ Writes the id of a tile, without checks or redrawing
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position of tile, within the map
+                new_id (int): new id of tile
+        """
+        self.ids[pos[0], pos[1]] = new_id
+
+    def set_region(self, pos, ids):
+        """ Changes the ids of every tile within an area of the map
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position of the topleft tile of
+                    the area
+                ids (NumPy array): new ids, indexed by [x, y] relative to
+                    pos, the area must lie within the map
+        """
+        area = pygame.Rect(pos, ids.shape)
+        if not pygame.Rect(0, 0, self.width, self.height).contains(area):
+            raise KeyError(pos)
+        self.store_region(area, ids)
+        if self.background is not None and area.colliderect(self.view):
+            self.render_tiles(area)
+            area = area.clip(self.view)
+            self.dirty.append(pygame.Rect((area.x - self.view.x)*TILE_SIZE,
+                (area.y - self.view.y)*TILE_SIZE,
+                area.width*TILE_SIZE, area.height*TILE_SIZE))
+
+    def store_region(self, area, ids):
+        """ Writes the ids of the tiles within an area, without checks or
+            redrawing
+
+            Arguments:
+                area (Pygame Rect): area in tiles, within the map
+                ids (NumPy array): new ids, indexed by [x, y] relative to
+                    the topleft of the area
+        """
+        self.ids[area.left:area.right, area.top:area.bottom] = ids
+
+    def region(self, area):
+        """ Gets the ids of the tiles within an area of the map
+
+            Arguments:
+                area (Pygame Rect): area in tiles, clipped to the map
+
+            Returns:
+                ids (NumPy array): ids of the tiles in the area, indexed by
+                    [x, y] relative to the topleft of the clipped area
+        """
+        area = area.clip(pygame.Rect(0, 0, self.width, self.height))
+        return self.ids[area.left:area.right, area.top:area.bottom]
+
+    def render(self, view=None):
+        """ Pre-renders every tile within the view onto an off-screen surface
+
+            The background is in screen coordinates, its topleft corner
+            shows the topleft tile of the view.
+
+            Arguments:
+                view (Pygame Rect): tiles to render, the current view by
+                    default
+
+            Returns:
+                self.background (Pygame Surface): image of the view
+        """
+        if view is not None:
+            self.view = pygame.Rect(view)
+        size = (self.view.width*TILE_SIZE, self.view.height*TILE_SIZE)
+        if self.background is None or self.background.get_size() != size:
+            self.background = create_surface(size)
+        self.render_tiles(self.view)
+        self.dirty = []
+        return self.background
+
+    def render_tiles(self, area):
+        """ Renders the tiles within an area of the view onto the background
+
+            Arguments:
+                area (Pygame Rect): area in tiles
+        """
+        area = area.clip(self.view)
+        left = (area.x - self.view.x)*TILE_SIZE
+        top = (area.y - self.view.y)*TILE_SIZE
+        for x, column in enumerate(self.region(area).tolist()):
+            for y, tile_id in enumerate(column):
+                self.background.blit(tile_images.get(tile_id),
+                    (left + x*TILE_SIZE, top + y*TILE_SIZE))
+
+    def scroll_to(self, x, y):
+        """ Moves the view, keeping its size
+
+            The part of the background still in view is shifted, so only
+            the tiles coming into view are rendered.
+
+            Arguments:
+                x (int): horizontal position of the new topleft tile
+                y (int): vertical position of the new topleft tile
+        """
+        dx = x - self.view.x
+        dy = y - self.view.y
+        if dx == 0 and dy == 0:
+            return
+        view = pygame.Rect(x, y, self.view.width, self.view.height)
+        if self.background is None \
+            or abs(dx) >= view.width or abs(dy) >= view.height:
+            self.render(view)
+        else:
+            self.background.scroll(-dx*TILE_SIZE, -dy*TILE_SIZE)
+            self.view = view
+            # Columns and rows that came into view
+            if dx > 0:
+                self.render_tiles(pygame.Rect(view.right - dx, view.y,
+                    dx, view.height))
+            elif dx < 0:
+                self.render_tiles(pygame.Rect(view.x, view.y,
+                    -dx, view.height))
+            if dy > 0:
+                self.render_tiles(pygame.Rect(view.x, view.bottom - dy,
+                    view.width, dy))
+            elif dy < 0:
+                self.render_tiles(pygame.Rect(view.x, view.y,
+                    view.width, -dy))
+        # Everything on screen moved
+        self.dirty = [self.background.get_rect()]
+
+    def keys(self):
+        for x in range(self.width):
+            for y in range(self.height):
+                yield (x, y)
+
+    def values(self):
+        for pos in self.keys():
+            yield self[pos]
+
+    def items(self):
+        for pos in self.keys():
+            yield pos, self[pos]
+
+    def __getitem__(self, pos):
+        if not self.in_bounds(pos):
+            raise KeyError(pos)
+        return TileView(self, pos[0], pos[1])
+
+    def __setitem__(self, pos, tile):
+        # Accept either a tile view or a plain tile id
+        self.set_id(pos, getattr(tile, "tile_id", tile))
+
+    def __contains__(self, pos):
+        return self.in_bounds(pos)
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return self.width * self.height
+
+
+class ChunkedTileMap(TileMap):
+    """ A tile map kept in a file instead of memory, for very large dungeons
+
+        The map is cut into square chunks of tile ids, stored one after the
+        other in the file. A chunk is memory-mapped when one of its tiles is
+        used, and the chunks used least recently are unmapped once more
+        than max_chunks are mapped, so the memory used stays bounded by the
+        part of the map in use (around the camera) rather than its size.
+        Reads and writes go straight to the mapped bytes.
+
+        Rooms and hallways are written into the map as rectangles of ids
+        (see set_region), so no object is kept per tile and the dungeon
+        itself only holds the rectangles of its rooms and hallways.
+
+        Behaves like a TileMap, except that there is no ids array of the
+        whole map: use get_id, set_id, region and set_region.
+    """
+    def __init__(self, width, height, path, tile_id=VOID,
+                 chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+        """ Creates new tile map file filled with a single type of tile
+
+            Arguments:
+                width (int): number of tiles horizontally
+                height (int): number of tiles vertically
+                path (str): path of the file to keep the tiles in, any
+                    existing file is overwritten
+                tile_id (int): id every tile starts with, default VOID
+                chunk_size (int): number of tiles per side of a chunk
+                max_chunks (int): most chunks mapped in memory at once
+        """
+        self.width = width
+        self.height = height
+        self.screen = DISPLAY_SURFACE
+        self.view = pygame.Rect(0, 0,
+            min(width, VIEW_WIDTH), min(height, VIEW_HEIGHT))
+        self.background = None
+        self.dirty = []
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks_x = -(-width // chunk_size)
+        self.chunks_y = -(-height // chunk_size)
+        chunk_bytes = chunk_size * chunk_size
+        with open(path, "wb") as tile_file:
+            if tile_id == 0:
+                # Left sparse, reads as zeros
+                tile_file.truncate(self.chunks_x * self.chunks_y * chunk_bytes)
+            else:
+                chunk = bytes([tile_id]) * chunk_bytes
+                for i in range(self.chunks_x * self.chunks_y):
+                    tile_file.write(chunk)
+        # Mapped chunks by (chunk x, chunk y), least recently used first
+        self.chunks = collections.OrderedDict()
+
+    def get_chunk(self, chunk_pos):
+        """ Gets a chunk, mapping it (and unmapping another) if needed
+
+            Arguments:
+                chunk_pos (2-tuple: int): (x, y) position of the chunk
+
+            Returns:
+                chunk (NumPy memmap): ids of the tiles of the chunk,
+                    indexed by [x, y] within the chunk
+        """
+        chunk = self.chunks.get(chunk_pos)
+        if chunk is not None:
+            self.chunks.move_to_end(chunk_pos)
+            return chunk
+        while len(self.chunks) >= self.max_chunks:
+            _, old_chunk = self.chunks.popitem(last=False)
+            old_chunk.flush()
+        index = chunk_pos[0]*self.chunks_y + chunk_pos[1]
+        chunk = np.memmap(self.path, dtype=np.uint8, mode="r+",
+            offset=index*self.chunk_size*self.chunk_size,
+            shape=(self.chunk_size, self.chunk_size))
+        self.chunks[chunk_pos] = chunk
+        return chunk
+
+    def get_id(self, pos):
+        if not self.in_bounds(pos):
+            raise KeyError(pos)
+        chunk = self.get_chunk((pos[0] // self.chunk_size,
+            pos[1] // self.chunk_size))
+        return int(chunk[pos[0] % self.chunk_size, pos[1] % self.chunk_size])
+
+    def store_id(self, pos, new_id):
+        chunk = self.get_chunk((pos[0] // self.chunk_size,
+            pos[1] // self.chunk_size))
+        chunk[pos[0] % self.chunk_size, pos[1] % self.chunk_size] = new_id
+
+    def store_region(self, area, ids):
+        size = self.chunk_size
+        for chunk_x in range(area.left // size, -(-area.right // size)):
+            for chunk_y in range(area.top // size, -(-area.bottom // size)):
+                chunk_area = pygame.Rect(chunk_x*size, chunk_y*size,
+                    size, size).clip(area)
+                chunk = self.get_chunk((chunk_x, chunk_y))
+                chunk[chunk_area.left - chunk_x*size:
+                      chunk_area.right - chunk_x*size,
+                      chunk_area.top - chunk_y*size:
+                      chunk_area.bottom - chunk_y*size] \
+                    = ids[chunk_area.left - area.left:
+                          chunk_area.right - area.left,
+                          chunk_area.top - area.top:
+                          chunk_area.bottom - area.top]
+
+    def region(self, area):
+        """ Gets the ids of the tiles within an area of the map
+
+            Arguments:
+                area (Pygame Rect): area in tiles, clipped to the map
+
+            Returns:
+                ids (NumPy array): copy of the ids of the tiles in the area,
+                    indexed by [x, y] relative to the topleft of the
+                    clipped area
+        """
+        area = area.clip(pygame.Rect(0, 0, self.width, self.height))
+        ids = np.empty((area.width, area.height), dtype=np.uint8)
+        size = self.chunk_size
+        for chunk_x in range(area.left // size, -(-area.right // size)):
+            for chunk_y in range(area.top // size, -(-area.bottom // size)):
+                chunk_area = pygame.Rect(chunk_x*size, chunk_y*size,
+                    size, size).clip(area)
+                chunk = self.get_chunk((chunk_x, chunk_y))
+                ids[chunk_area.left - area.left:chunk_area.right - area.left,
+                    chunk_area.top - area.top:chunk_area.bottom - area.top] \
+                    = chunk[chunk_area.left - chunk_x*size:
+                            chunk_area.right - chunk_x*size,
+                            chunk_area.top - chunk_y*size:
+                            chunk_area.bottom - chunk_y*size]
+        return ids
+
+    def prefetch(self, area):
+        """ Maps the chunks overlapping an area ahead of their use
+
+            Arguments:
+                area (Pygame Rect): area in tiles
+        """
+        area = area.clip(pygame.Rect(0, 0, self.width, self.height))
+        size = self.chunk_size
+        for chunk_x in range(area.left // size, -(-area.right // size)):
+            for chunk_y in range(area.top // size, -(-area.bottom // size)):
+                self.get_chunk((chunk_x, chunk_y))
+
+    def scroll_to(self, x, y):
+        super(ChunkedTileMap, self).scroll_to(x, y)
+        # Page in the chunks around the view before the player gets there
+        margin = self.chunk_size // 2
+        self.prefetch(self.view.inflate(2*margin, 2*margin))
+
+    def flush(self):
+        """ Writes the mapped chunks back to the file """
+        for chunk in self.chunks.values():
+            chunk.flush()
+
+    def close(self):
+        """ Writes back and unmaps every chunk """
+        self.flush()
+        self.chunks.clear()
+
+
+class Room():
     """ Class used to represent a room
 
         A room is a collection of interior tiles surrounded by walls.
@@ -122,9 +518,10 @@ class Room(pygame.sprite.Group):
         attached to it.
 
         A room is located in space based upon the (x, y) position of its
-        top-left tile.
+        top-left tile. Only its rectangle is kept, the tiles themselves are
+        written into the tile map of the dungeon (see write).
     """
-    def __init__(self, x, y, width, height):
+    def __init__(self, x, y, width, height, rng=None):
         """ Creates new Room object
 
             Arguments:
@@ -133,82 +530,52 @@ class Room(pygame.sprite.Group):
                 center (2-tuple: int): x, y position of center of room
                 width (int): width of room in tilemap
                 height (int): height of room in tilemap
+                rng (Random): random number generator to use,
+                    default is the global random module
 
         """
-        # Call baseclass constructor
-        super(Room, self).__init__()
-
-        # Init
+        self.random = rng if rng is not None else random
         self.x = x
         self.y = y
         self.center = ( (x + (width - 1)) // 2 , (y + (height - 1)) // 2 )
         self.width = width
         self.height = height
-        self.interior = {}
-        self.border = {}
-        self.doors = {}
-
-        # Generate horizontal borders
-        for row in range(y, y + height):
-            for col in (x, x + (width - 1)):
-                self.add(Tile(WALL, col, row))
-                self.border[(col, row)] = Tile(WALL, col, row)
-
-        # Generate vertical borders
-        for row in (y, y + (height - 1)):
-            for col in range(x, x + width):
-                self.add(Tile(WALL, col, row))
-                self.border[(col, row)] = Tile(WALL, col, row)
-
-        # Generate interior of room
-        for row in range(y + 1, (y + height) - 1):
-            for col in range(x + 1, (x + width) - 1):
-                self.add(Tile(FLOOR, col, row))
-                if random.random() <= CHANCE_GEN_GRASS:
-                    self.interior[(col, row)] = Tile(GRASS, col, row)
-                else:
-                    self.interior[(col, row)] = Tile(FLOOR, col, row)
+        # Tiles within the walls
+        self.interior = pygame.Rect(x + 1, y + 1, width - 2, height - 2)
 
-    def get_tile_dict(self):
-        """ Gets a dictionary of all tiles within the room
+    def write(self, tile_map):
+        """ Writes the tiles of the room into a tile map
 
-            Returns:
-                tile_dict (dict): dictionary of all tiles in the room with the
-                    (x, y) coordinates of each tile as keys and instances
-                    of the Tile class as the values
-        """
-        tile_dict = self.interior.copy()
-        tile_dict.update(self.border)
-        tile_dict.update(self.doors)
-        return tile_dict
-
-    def draw(self):
-        """ Draws all tiles in the room """
-        for tile in self.sprites():
-            tile.draw()
-
-    def add_door(self, door):
-        """ Adds the given door tile to the room
+            The border is made of walls and every interior tile is either
+            floor or grass, picked at random row by row.
 
             Arguments:
-                door (Tile): instance of the Tile class with the DOOR id and
-                    image
+                tile_map (TileMap): tile map of the dungeon
         """
-        # Remove from sprite group and border dict
-        self.remove(border[(door.x, door.y)])
-        del self.border[(door.x, door.y)]
-        # Add to doors dict and the sprite group
-        self.doors.add(door)
-        self.add(door)
-
-    def pick_interior_point(self):
+        grass = [[self.random.random() <= CHANCE_GEN_GRASS
+                    for col in range(self.interior.width)]
+                    for row in range(self.interior.height)]
+        ids = np.full((self.width, self.height), WALL, dtype=np.uint8)
+        ids[1:-1, 1:-1] = np.where(np.array(grass, dtype=bool).T,
+            GRASS, FLOOR)
+        tile_map.set_region((self.x, self.y), ids)
+
+    def pick_interior_point(self, rng=None):
         """ Gets random point within interior of room
 
+            Arguments:
+                rng (Random): random number generator to use, default is
+                    the room's
+
             Returns:
                 interior_point (2-tuple: int): (x, y) position of randomly
                 picked point within interior
         """
-        interior_point = random.choice(list(self.interior.keys()))
+        rng = rng if rng is not None else self.random
+        # Interior tiles are numbered row by row
+        index = rng.choice(range(self.interior.width * self.interior.height))
+        interior_point = (self.interior.x + index % self.interior.width,
+            self.interior.y + index // self.interior.width)
         return interior_point
 
     def __str__(self):
@@ -222,7 +589,8 @@ class Room(pygame.sprite.Group):
     MIN_HEIGHT = 5
     MAX_HEIGHT = 10
     @classmethod
-    def generate_room(cls, region_x, region_y, region_width, region_height):
+    def generate_room(cls, region_x, region_y, region_width, region_height,
+                        rng=random):
         """ Generate room enclosed within a specified region
 
             Creates a room within a specified region (aka partition of
@@ -235,6 +603,8 @@ class Room(pygame.sprite.Group):
                 region_y (int): y position of topleft corner of enclosing region
                 region_width (int): width of enclosing region
                 region_height (int): height of enclosing region
+                rng (Random): random number generator to use,
+                    default is the global random module
 
             Returns:
                 room (Room): an instance of the Room class
@@ -250,25 +620,25 @@ class Room(pygame.sprite.Group):
             room_width = cls.MIN_WIDTH
             room_x = region_x + 1
         else:
-            room_width = random.randint(cls.MIN_WIDTH,
+            room_width = rng.randint(cls.MIN_WIDTH,
                             min(region_width - 2, cls.MAX_WIDTH))
-            room_x = random.randint(region_x + 1,
+            room_x = rng.randint(region_x + 1,
                         (region_x + region_width - 1) - room_width)
         if region_height == Dungeon.MIN_HEIGHT:
             room_height = cls.MIN_HEIGHT
             room_y = region_y + 1
         else:
-            room_height = random.randint(cls.MIN_HEIGHT,
+            room_height = rng.randint(cls.MIN_HEIGHT,
                             min(region_height - 2, cls.MAX_HEIGHT))
-            room_y = random.randint(region_y + 1,
+            room_y = rng.randint(region_y + 1,
                         (region_y + region_height - 1) - room_height)
-        room = cls(room_x, room_y, room_width, room_height)
+        room = cls(room_x, room_y, room_width, room_height, rng)
         if DEBUG_SPLIT:
             print(room)
         return room
 
 
-class Hallway(pygame.sprite.Sprite):
+class Hallway():
     """ Class used to create and interact with a hallway
 
         A hallway is a path of tiles where every tile in the path is connected
@@ -278,8 +648,11 @@ class Hallway(pygame.sprite.Sprite):
 
         Every hallway tile must be surrounded by a border if it does not
         intersect with another hallway.
+
+        The path is kept as its straight sections, the tiles themselves are
+        written into the tile map of the dungeon as the sections are created.
     """
-    def __init__(self, start, end, path=None):
+    def __init__(self, start, end, tile_map=None, rng=None):
         """ Creates hallway object
 
             Arguments:
@@ -287,157 +660,226 @@ class Hallway(pygame.sprite.Sprite):
                                     door of a room)
                 end (2-tuple: int): end position of hallway (adjacent to a door
                     of a room)
-                width (int): width of hallway
-                height (int): height of hallway
-                path (dict): dictionary with (x, y) position of each tile
-                    within the path as keys and instances of the Tile class at
-                    these positions as values
-        """
-        if path is None:
-            self.path = {}
-        elif type(path) == list:
-            # Assume path is a list of Tile class instances, convert to
-            # dictionary
-            self.path = {}
-            for tile in path:
-                self.path[(tile.x, tile.y)] = tile
-        elif type(path) == dict:
-            self.path = path
-        else:
-            raise ValueError("Invalid type for path")
+                tile_map (TileMap): tile map to write the path into, None to
+                    only keep the sections
+                rng (Random): random number generator to use,
+                    default is the global random module
+        """
+        self.random = rng if rng is not None else random
+        self.tile_map = tile_map
         self.start = start
         self.end = end
-        self.border = {}
+        # Straight sections of the path, as rects in tiles
+        self.sections = []
 
-    def get_path(self):
-        """ Get path of hallway as a dictionary
+    def add_section(self, section):
+        """ Adds a straight section to the path
 
-            Returns:
-                self.path (dict): dictionary with (x, y) position of each tile
-                    in path as keys and their corresponding Tile class instance
-                    as values
+            Every tile of the section is either floor or grass, picked at
+            random from its topleft tile on, and written into the tile map.
+
+            Arguments:
+                section (Pygame Rect): area in tiles, one tile wide or high
         """
-        return self.path
+        self.sections.append(section)
+        ids = np.array([GRASS if self.random.random() <= CHANCE_GEN_GRASS
+                        else FLOOR
+                        for i in range(section.width * section.height)],
+                       dtype=np.uint8).reshape(section.size)
+        if self.tile_map is not None:
+            self.tile_map.set_region(section.topleft, ids)
+
+    def create_horz_path(self, start=None, end=None):
+        """ Creates horizontal path given a start and an end point
 
-    def get_path_list(self):
-        """ Gets path of  hallway as a list
+            Arguments:
+                start (2-tuple: int): start point of hallway
+                end (2-tuple: int): end point of hallway
+        """
+        if start is None and end is None:
+            start = self.start
+            end = self.end
+        left = min(start[0], end[0])
+        right = max(start[0], end[0])
+        self.add_section(pygame.Rect(left, start[1], right - left + 1, 1))
 
-            Returns:
-                path_list (list: Tile): list of Tile class instances
-                corresponding to every tile within path of hallway
+    def create_vert_path(self, start=None, end=None):
+        """ Creates vertical path given a start and an end point
+
+            Arguments:
+                start (2-tuple: int): start point of hallway
+                end (2-tuple: int): end point of hallway
         """
-        path_list = list(self.path.values())
-        return path_list
+        if start is None and end is None:
+            start = self.start
+            end = self.end
+        top = min(start[1], end[1])
+        bottom = max(start[1], end[1])
+        self.add_section(pygame.Rect(start[0], top, 1, bottom - top + 1))
 
-    def get_border(self):
-        """ Get border of hallway as a dictionary
+    def covers(self, pos):
+        """ Checks whether a position lies on the path
+
+            Arguments:
+                pos (2-tuple: int): (x, y) position
 
             Returns:
-                self.border (dict): dictionary with (x, y) position of each
-                    tile in border as keys and their corresponding Tile class
-                    instance as values
+                covers (bool): True if a section of the path contains pos
+        """
+        return any(section.collidepoint(pos) for section in self.sections)
+
+    def __str__(self):
+        return "Hallway( {}, {} )".format(self.start, self.end)
+
+
+class Camera():
+    """ The part of the dungeon shown on screen
+
+        The camera keeps a target (the player) in the middle of its view,
+        without showing anything past the edges of the dungeon. The view
+        moves a whole tile at a time and is shown in the topleft corner of
+        the screen, so a position within the dungeon is drawn at that
+        position minus the offset of the camera.
+    """
+    def __init__(self, map_width, map_height,
+                 width=VIEW_WIDTH, height=VIEW_HEIGHT):
+        """ Creates new camera in the topleft corner of the dungeon
+
+            Arguments:
+                map_width (int): width of the dungeon in tiles
+                map_height (int): height of the dungeon in tiles
+                width (int): width of the view in tiles, at most the
+                    width of the dungeon
+                height (int): height of the view in tiles, at most the
+                    height of the dungeon
         """
-        return self.border
+        self.map_width = map_width
+        self.map_height = map_height
+        self.width = min(width, map_width)
+        self.height = min(height, map_height)
+        self.x = 0
+        self.y = 0
+        self.screen = DISPLAY_SURFACE
+
+    @property
+    def view(self):
+        """ Tiles within the view (Pygame Rect) """
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
+    @property
+    def offset(self):
+        """ Position of the topleft of the view in the dungeon, in pixels """
+        return (self.x*TILE_SIZE, self.y*TILE_SIZE)
+
+    @property
+    def screen_rect(self):
+        """ Area of the screen the view is shown in (Pygame Rect) """
+        return pygame.Rect(0, 0, self.width*TILE_SIZE, self.height*TILE_SIZE)
+
+    def visible_area(self, margin=TILE_SIZE):
+        """ Gets the positions of sprites that can be seen in the view
 
-    def get_border_list(self):
-        """ Gets border of  hallway as a list
+            Arguments:
+                margin (int): size of the sprites in pixels, so sprites
+                    partly out of the view are included
 
             Returns:
-                border_list (list: Tile): list of Tile class instances
-                    corresponding to every tile within border of hallway
+                area (Pygame Rect): positions within the dungeon, in pixels
         """
-        border_list = list(self.border.values())
-        return border_list
+        x, y = self.offset
+        return pygame.Rect(x - margin + 1, y - margin + 1,
+            self.width*TILE_SIZE + margin - 1,
+            self.height*TILE_SIZE + margin - 1)
 
-    def get_tile_dict(self):
-        """ Gets dictionary of all tiles within the hallway
+    def follow(self, pos):
+        """ Moves the view so that a position is in the middle of it
+
+            Arguments:
+                pos (2-tuple: int): position within the dungeon, in pixels
 
             Returns:
-                tile_dict (dict): dictionary of all tiles within hallway, both
-                    border and path, with (x, y) position of each tile as keys
-                    and their corresponding Tile class instances as values
+                moved (bool): True if the view changed
         """
-        tile_dict = self.path.copy()
-        tile_dict.update(self.border)
-        return tile_dict
+        x = pos[0]//TILE_SIZE - self.width//2
+        y = pos[1]//TILE_SIZE - self.height//2
+        x = max(0, min(x, self.map_width - self.width))
+        y = max(0, min(y, self.map_height - self.height))
+        moved = (x, y) != (self.x, self.y)
+        self.x = x
+        self.y = y
+        return moved
 
-    def create_horz_path(self, start=None, end=None, add_border=False):
-        """ Creates horizontal path given a start and an end point
+    def to_screen(self, pos):
+        """ Converts a position within the dungeon to the screen
 
             Arguments:
-                start (2-tuple: int): start point of hallway
-                end (2-tuple: int): end point of hallway
-                add_border (bool): sets wheter border tiles should
-                    automatically
-                    be created upon generation of horizontal path section.
-                    Default: False
+                pos (2-tuple: int): position within the dungeon, in pixels
+
+            Returns:
+                pos (2-tuple: int): position on screen, in pixels
         """
-        if start is None and end is None:
-            start = self.start
-            end = self.end
-        # Assume path to right first
-        limits = range(start[0], end[0] + 1)
-        if end[0] < start[0]:
-            # Path is actually to left
-            limits = range(end[0], start[0] + 1)
-
-        for x in limits:
-            for y in (start[1] - 1, start[1], start[1] + 1):
-                if y == start[1]:
-                    if random.random() <= CHANCE_GEN_GRASS:
-                        self.path[(x,y)] = Tile(GRASS, x, y)
-                    else:
-                        self.path[(x,y)] = Tile(FLOOR, x, y)
-                elif add_border:
-                    self.border[(x,y)] = Tile(WALL, x, y)
+        return (pos[0] - self.x*TILE_SIZE, pos[1] - self.y*TILE_SIZE)
 
-    def create_vert_path(self, start=None, end=None, add_border=False):
-        """ Creates vertical path given a start and an end point
+    def draw_sprite(self, image, pos):
+        """ Draws an image at a position within the dungeon
+
+            Only the part of the image within the view is drawn.
 
             Arguments:
-                start (2-tuple: int): start point of hallway
-                end (2-tuple: int): end point of hallway
-                add_border (bool): sets wheter border tiles should
-                    automatically
-                    be created upon generation of vertical path section.
-                    Default: False
+                image (Pygame Surface): image to draw
+                pos (2-tuple: int): position of its topleft corner within
+                    the dungeon, in pixels
+
+            Returns:
+                rect (Pygame Rect): area of the screen that was drawn
         """
-        if start is None and end is None:
-            start = self.start
-            end = self.end
-        # Assume path is down
-        limits = range(start[1], end[1] + 1)
-        if end[1] < start[1]:
-            # Path is actually up
-            limits = range(end[1], start[1] + 1)
-
-        for y in limits:
-            for x in (start[0] - 1, start[0], start[0] + 1):
-                if x == start[0]:
-                    if random.random() <= CHANCE_GEN_GRASS:
-                        self.path[(x,y)] = Tile(GRASS, x, y)
-                    else:
-                        self.path[(x,y)] = Tile(FLOOR, x, y)
-                elif add_border:
-                    self.border[(x, y)] = Tile(WALL, x, y)
+        x, y = self.to_screen(pos)
+        rect = pygame.Rect((x, y), image.get_size()).clip(self.screen_rect)
+        if rect.width == 0 or rect.height == 0:
+            return rect
+        return self.screen.blit(image, rect, rect.move(-x, -y))
 
-    def draw(self, draw_border=True):
-        """ Draws specified tiles within hallway
 
-            Arguments:
-                draw_border (bool): sets wheter border should be drawn or not.
-                    Default: False
+class Partition():
+    """ Class used to represent a region of the dungeon within the BSP tree
+
+        A partition is a rectangular region of the dungeon. It is either a
+        leaf holding a single room or has been split (horizontally or
+        vertically) into two child partitions, in which case it also holds
+        the hallway connecting the rooms of its two children.
 
+        Partitions are plain data describing how a dungeon was generated,
+        nothing is drawn when they are created.
+    """
+    def __init__(self, x, y, width, height):
+        """ Creates new partition without children
+
+            Arguments:
+                x (int): x position of topleft corner of region
+                y (int): y position of topleft corner of region
+                width (int): width of region
+                height (int): height of region
         """
-        for tile in self.path.values():
-            tile.draw()
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.split = None
+        self.children = []
+        self.room = None
+        self.hallway = None
+
+    def is_leaf(self):
+        """ Checks whether the partition has been split
 
-        if draw_border:
-            for tile in self.border.values():
-                tile.draw()
+            Returns:
+                is_leaf (bool): True if the partition has no children
+        """
+        return not self.children
 
     def __str__(self):
-        return "Hallway( {}, {} )".format(self.start, self.end)
+        return "region: ( {}, {}, {}, {} )".format(self.x, self.y,
+            self.width, self.height)
 
 
 class Dungeon(pygame.sprite.Sprite):
@@ -456,50 +898,146 @@ class Dungeon(pygame.sprite.Sprite):
         The dungeon stores the tiles at every position within a tile map.
         A list of rooms and hallways is also stored. Also, a dungeon must have
         a ladder in which the player can be transported to the level below.
+
+        Every random choice made while generating the dungeon comes from the
+        dungeon's own random number generator, so a dungeon can be rebuilt
+        from its seed.
     """
     MIN_WIDTH = Room.MIN_WIDTH + 2
     MIN_HEIGHT = Room.MIN_HEIGHT + 2
     MAX_WIDTH = Room.MAX_WIDTH + 2
     MAX_HEIGHT = Room.MAX_HEIGHT + 2
-    def __init__(self, height=MAP_HEIGHT, width=MAP_WIDTH):
+    def __init__(self, height=MAP_HEIGHT, width=MAP_WIDTH, seed=None,
+                 generate=True, chunk_file=None, render=True):
         """
         Creates new dungeon object
+
+        Nothing is drawn to the screen, call draw once the dungeon should be
+        displayed.
         Arguments:
             height (int): dungeon height, default specified in level_constants
             width (int): dungeon width, default specified in level_constants
+            seed (int): seed of the dungeon's random number generator,
+                picked from the global random module by default
+            generate (bool): set False to get an empty dungeon whose
+                generation steps are run by the caller (split_region,
+                create_rooms, connect_partitions,
+                create_all_hallway_borders, then tile_map.render)
+            chunk_file (str): path of a file to keep the tiles in, in
+                chunks, for dungeons too large to keep in memory (see
+                ChunkedTileMap), by default the tiles are kept in memory
+            render (bool): set False to leave the view unrendered, so no
+                surface is touched, tile_map.render must then be called
+                before the dungeon is drawn
         """
         # Call baseclass constructor
         super(Dungeon, self).__init__()
 
         # Init
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.random = random.Random(seed)
         self.width = width
         self.height = height
-        self.screen = pygame.display.get_surface()
+        self.screen = DISPLAY_SURFACE
         self.rooms = []
         self.hallways = []
+        self.partition = None
         self.ladder_pos = None
 
-        self.tile_map = dict()
-        for x in range(self.width):
-            for y in range(self.height):
-                self.tile_map[(x,y)] = Tile(VOID, x, y)
-        self.draw((self.width,), (self.height,))
+        if chunk_file is None:
+            self.tile_map = TileMap(self.width, self.height)
+        else:
+            self.tile_map = ChunkedTileMap(self.width, self.height,
+                chunk_file)
+        self.camera = Camera(self.width, self.height)
+        if not generate:
+            return
         if ENABLE_GEN:
             self.generate_dungeon(0, 0, self.width, self.height)
             self.create_all_hallway_borders()
+        if render:
+            self.tile_map.render()
 
     def draw(self, x_limits, y_limits):
         """
-        Displays map on screen
+        Displays map on screen by copying it from the pre-rendered background
+        Only the part of the range within the camera's view is drawn.
             Arguments:
                 x_limits (2-tuple: int): range of desired x-values within the
                     dungeon to draw
                 y_limits (2-tupe: int): range of desired y-values within the
                     dungeon to draw
+
+            Returns:
+                rect (Pygame Rect): area of the screen that was drawn
+        """
+        cols = range(*x_limits)
+        rows = range(*y_limits)
+        x, y = self.camera.to_screen((cols.start*TILE_SIZE,
+            rows.start*TILE_SIZE))
+        rect = pygame.Rect(x, y, len(cols)*TILE_SIZE, len(rows)*TILE_SIZE)
+        rect = self.clear(rect)
+        if VISUALIZE_SPLIT:
+            self.draw_splits()
+        return rect
+
+    def draw_splits(self):
+        """ Draws the split lines of every partition of the dungeon """
+        for partition in self.iter_partitions():
+            if partition.is_leaf():
+                continue
+            second = partition.children[1]
+            start = (second.x * TILE_SIZE, second.y * TILE_SIZE)
+            if partition.split == "horz":
+                end = ((second.x + partition.width) * TILE_SIZE, start[1])
+            else:
+                end = (start[0], (second.y + partition.height) * TILE_SIZE)
+            pygame.draw.line(self.screen, GREEN, self.camera.to_screen(start),
+                self.camera.to_screen(end), TILE_SIZE)
+
+    def clear(self, rect):
+        """ Restores the dungeon underneath an area of the screen
+
+            Used to erase sprites drawn on top of the dungeon.
+
+            Arguments:
+                rect (Pygame Rect): area of the screen to restore
+
+            Returns:
+                rect (Pygame Rect): area of the screen that was restored,
+                    clipped to the dungeon
+        """
+        rect = rect.clip(self.tile_map.background.get_rect())
+        self.screen.blit(self.tile_map.background, rect, rect)
+        return rect
+
+    def follow(self, pos):
+        """ Moves the camera to keep a position in the middle of the screen
+
+            Arguments:
+                pos (2-tuple: int): position within the dungeon, in pixels
+
+            Returns:
+                moved (bool): True if the view changed, the whole view is
+                    then redrawn by the next call to pop_dirty_rects
+        """
+        if not self.camera.follow(pos):
+            return False
+        self.tile_map.scroll_to(self.camera.x, self.camera.y)
+        return True
+
+    def pop_dirty_rects(self):
+        """ Draws the tiles that changed since the last call (doors, ladder)
+
+            Returns:
+                dirty_rects (list: Pygame Rect): areas of the screen that
+                    were redrawn
         """
-        for col in range(*x_limits):
-            for row in range(*y_limits):
-                self.tile_map[(col, row)].draw()
+        dirty_rects = [self.clear(rect) for rect in self.tile_map.dirty]
+        self.tile_map.dirty = []
+        return dirty_rects
 
     def add_rand_room(self, region_x, region_y, region_width, region_height):
         """ Generates random room on map and adds to room list
@@ -514,10 +1052,9 @@ class Dungeon(pygame.sprite.Sprite):
                 room (Room): generated room, instance of Room class
         """
         room = Room.generate_room(region_x, region_y,
-                                    region_width, region_height)
+                                    region_width, region_height, self.random)
         self.rooms.append(room)
-        self.tile_map.update(room.get_tile_dict())
-        room.draw()
+        room.write(self.tile_map)
         return room
 
     def pick_random_room(self):
@@ -526,7 +1063,7 @@ class Dungeon(pygame.sprite.Sprite):
             Returns:
                 room (Room): randomly picked room, instance of Room class
         """
-        room = random.choice(list(self.rooms))
+        room = self.random.choice(list(self.rooms))
         return room
 
     def filter_rooms(self, *rooms):
@@ -573,10 +1110,7 @@ class Dungeon(pygame.sprite.Sprite):
         """
         ladder_room = self.farthest_room(player_room, self.rooms)
         self.ladder_pos = ladder_room.pick_interior_point()
-        # Drawing ladder doesn't work for some reason
-        self.tile_map[self.ladder_pos] = Tile(LADDER,
-            self.ladder_pos[0], self.ladder_pos[1])
-        self.tile_map[self.ladder_pos].draw()
+        self.tile_map.set_id(self.ladder_pos, LADDER)
 
     def check_ladder_reached(self, player):
         """ Check wheter the player has reached the ladder
@@ -611,10 +1145,10 @@ class Dungeon(pygame.sprite.Sprite):
         """ Finds all adjacent tiles to given tile within tilemap
 
             Arguments:
-                curr (Tile): current tile within tilemap
+                curr (TileView): current tile within tilemap
 
             Returns:
-                neighbours (list: Tile): neighbouring tiles of curr
+                neighbours (list: TileView): neighbouring tiles of curr
         """
         neighbours = []
         for row in range(max(0, curr.y - 1), min(self.height, curr.y + 2)):
@@ -624,12 +1158,28 @@ class Dungeon(pygame.sprite.Sprite):
 
         return neighbours
 
+    def add_door(self, hallway, pos):
+        """ Places a door where a hallway meets a room
+
+            The path of the hallway was written first, and where it runs
+            over the door's position it is kept.
+
+            Arguments:
+                hallway (Hallway): hallway leading to the door
+                pos (2-tuple: int): (x, y) position of the door
+        """
+        if not hallway.covers(pos):
+            self.tile_map.set_id(pos, DOOR)
+
     def connect_rooms(self, r1, r2):
         """ Creates hallway between two rooms within dungeon
 
             Arguments:
                 r1 (Room): room within dungeon, instance of Room class
                 r2 (Room): other room wihtin dungeon, instance of Room class
+
+            Returns:
+                hallway (Hallway): hallway connecting the two rooms
         """
         if r1 == r2:
             raise ValueError("Can't connect room with itself")
@@ -637,78 +1187,77 @@ class Dungeon(pygame.sprite.Sprite):
         if DEBUG_CONNECT:
             print("Connecting {} and {}".format(r1, r2))
         choices = []
-        overlap_y = {y for y in range(r1.y + 1, r1.y + r1.height - 1)} \
-                        & {y for y in range(r2.y + 1, r2.y + r2.height - 1)}
+        # Rows and columns within the interior of both rooms
+        overlap_y = range(max(r1.y, r2.y) + 1,
+                          min(r1.y + r1.height, r2.y + r2.height) - 1)
         if overlap_y:
             choices.append("horz")
-        overlap_x = {x for x in range(r1.x + 1, r1.x + r1.width - 1)} \
-                        & {x for x in range(r2.x + 1, r2.x + r2.width - 1)}
+        overlap_x = range(max(r1.x, r2.x) + 1,
+                          min(r1.x + r1.width, r2.x + r2.width) - 1)
         if overlap_x:
             choices.append("vert")
 
         if not choices:
             if DEBUG_CONNECT:
                 print("L-shaped hallway")
-            p1 = random.choice(list(r1.interior.values()))
-            p2 = random.choice(list(r2.interior.values()))
+            p1 = r1.pick_interior_point(self.random)
+            p2 = r2.pick_interior_point(self.random)
             if VISUALIZE_CONNECT:
-                p1.set_id(GRASS)
-                p1.draw()
-                p2.set_id(GRASS)
-                p2.draw()
-            dx = p2.x - p1.x
-            dy = p2.y - p1.y
+                self.tile_map[p1].set_id(GRASS)
+                self.tile_map[p2].set_id(GRASS)
+            dx = p2[0] - p1[0]
+            dy = p2[1] - p1[1]
             if dx > 0:
                 if dy > 0:
                     # r2 is down and to the right from r1
                     if DEBUG_CONNECT:
                         print("Case 1", end="")
-                    if random.random() > 0.5:
+                    if self.random.random() > 0.5:
                         # Horzontal then Vertical
                         if DEBUG_CONNECT:
                             print("a")
-                        r1_door_pos = (r1.x + r1.width - 1,  p1.y)
-                        r2_door_pos = (p2.x, r2.y)
+                        r1_door_pos = (r1.x + r1.width - 1,  p1[1])
+                        r2_door_pos = (p2[0], r2.y)
                         start = (r1_door_pos[0] + 1, r1_door_pos[1])
                         end = (r2_door_pos[0], r2_door_pos[1] - 1)
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_horz_path(start, (end[0], start[1]))
                         hallway.create_vert_path((end[0],start[1]), end)
                     else:
                         # Vertical then Horzontal
                         if DEBUG_CONNECT:
                             print("b")
-                        r1_door_pos = (p1.x, r1.y + r1.height - 1)
-                        r2_door_pos = (r2.x, p2.y)
+                        r1_door_pos = (p1[0], r1.y + r1.height - 1)
+                        r2_door_pos = (r2.x, p2[1])
                         start = (r1_door_pos[0], r1_door_pos[1] + 1)
                         end = (r2_door_pos[0] - 1, r2_door_pos[1])
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_vert_path(start, (start[0], end[1]))
                         hallway.create_horz_path((start[0], end[1]), end)
                 else:
                     # r2 is up and to the right from r1
                     if DEBUG_CONNECT:
                         print("Case 2", end="")
-                    if random.random() > 1.0:
+                    if self.random.random() > 1.0:
                         # Horzontal then vertical
                         if DEBUG_CONNECT:
                             print("a")
-                        r1_door_pos = (r1.x + r1.width - 1, p1.y)
-                        r2_door_pos = (p2.x, r2.y + r2.height - 1)
+                        r1_door_pos = (r1.x + r1.width - 1, p1[1])
+                        r2_door_pos = (p2[0], r2.y + r2.height - 1)
                         start = (r1_door_pos[0] + 1, r1_door_pos[1])
                         end = (r2_door_pos[0], r2_door_pos[1] + 1)
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_horz_path(start, (end[0], start[1]))
                         hallway.create_vert_path((end[0],start[1]), end)
                     else:
                         # Vertical then horizontal
                         if DEBUG_CONNECT:
                             print("b")
-                        r1_door_pos = (p1.x, r1.y)
-                        r2_door_pos = (r2.x, p2.y)
+                        r1_door_pos = (p1[0], r1.y)
+                        r2_door_pos = (r2.x, p2[1])
                         start = (r1_door_pos[0], r1_door_pos[1] - 1)
                         end = (r2_door_pos[0] - 1, r2_door_pos[1])
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_vert_path(start, (start[0], end[1]))
                         hallway.create_horz_path((start[0], end[1]), end)
             else:
@@ -716,70 +1265,65 @@ class Dungeon(pygame.sprite.Sprite):
                     # r2 down and to the left from r1
                     if DEBUG_CONNECT:
                         print("Case 3", end="")
-                    if random.random() > 0.5:
+                    if self.random.random() > 0.5:
                         # Horizontal then vertical
                         if DEBUG_CONNECT:
                             print("a")
-                        r1_door_pos = (r1.x,  p1.y)
-                        r2_door_pos = (p2.x, r2.y)
+                        r1_door_pos = (r1.x,  p1[1])
+                        r2_door_pos = (p2[0], r2.y)
                         start = (r1_door_pos[0] - 1, r1_door_pos[1])
                         end = (r2_door_pos[0], r2_door_pos[1] - 1)
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_horz_path(start, (end[0], start[1]))
                         hallway.create_vert_path((end[0],start[1]), end)
                     else:
                         # Vertical then horizontal
                         if DEBUG_CONNECT:
                             print("b")
-                        r1_door_pos = (p1.x, r1.y + r1.height - 1)
-                        r2_door_pos = (r2.x + r2.width - 1, p2.y)
+                        r1_door_pos = (p1[0], r1.y + r1.height - 1)
+                        r2_door_pos = (r2.x + r2.width - 1, p2[1])
                         start = (r1_door_pos[0], r1_door_pos[1] + 1)
                         end = (r2_door_pos[0] + 1, r2_door_pos[1])
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_vert_path(start, (start[0], end[1]))
                         hallway.create_horz_path((start[0], end[1]), end)
                 else:
                     # r2 is up and to the left from r1
                     if DEBUG_CONNECT:
                         print("Case 4", end="")
-                    if random.random() > 1.0:
+                    if self.random.random() > 1.0:
                         if DEBUG_CONNECT:
                             print("a")
                         # Horizontal then vertical
-                        r1_door_pos = (r1.x,  p1.y)
-                        r2_door_pos = (p2.x, r2.y + r2.height - 1)
+                        r1_door_pos = (r1.x,  p1[1])
+                        r2_door_pos = (p2[0], r2.y + r2.height - 1)
                         start = (r1_door_pos[0] - 1, r1_door_pos[1])
                         end = (r2_door_pos[0], r2_door_pos[1] + 1)
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_horz_path(start, (end[0], start[1]))
                         hallway.create_vert_path((end[0], start[1]), end)
                     else:
                         if DEBUG_CONNECT:
                             print("b")
                         # Vertical then horizontal
-                        r1_door_pos = (p1.x, r1.y)
-                        r2_door_pos = (r2.x + r2.width - 1, p2.y)
+                        r1_door_pos = (p1[0], r1.y)
+                        r2_door_pos = (r2.x + r2.width - 1, p2[1])
                         start = (r1_door_pos[0], r1_door_pos[1] - 1)
                         end = (r2_door_pos[0] + 1, r2_door_pos[1])
-                        hallway = Hallway(start, end)
+                        hallway = Hallway(start, end, self.tile_map, self.random)
                         hallway.create_vert_path(start, (start[0], end[1]))
                         hallway.create_horz_path((start[0], end[1]), end)
             if DEBUG_CONNECT:
-                self.tile_map[(p1.x, p1.y)].set_id(XMARK)
-                self.tile_map[(p1.x, p1.y)].draw()
-                self.tile_map[(p2.x, p2.y)].set_id(XMARK)
-                self.tile_map[(p2.x, p2.y)].draw()
-            self.tile_map[r1_door_pos].set_id(DOOR)
-            self.tile_map[r1_door_pos].draw()
-            self.tile_map[r2_door_pos].set_id(DOOR)
-            self.tile_map[r2_door_pos].draw()
-            hallway.draw()
+                self.tile_map[p1].set_id(XMARK)
+                self.tile_map[p2].set_id(XMARK)
+            self.add_door(hallway, r1_door_pos)
+            self.add_door(hallway, r2_door_pos)
         else:
-            hallway_dir = random.choice(choices)
+            hallway_dir = self.random.choice(choices)
             if hallway_dir == "horz":
                 if DEBUG_CONNECT:
                     print("Horzontal Hallway")
-                door_y = random.choice(list(overlap_y))
+                door_y = self.random.choice(overlap_y)
                 if r1.x < r2.x:
                     r1_door_x = r1.x + r1.width - 1
                     r2_door_x = r2.x
@@ -790,17 +1334,14 @@ class Dungeon(pygame.sprite.Sprite):
                     r2_door_x = r2.x + r2.width - 1
                     start = (r1_door_x - 1, door_y)
                     end = (r2_door_x + 1, door_y)
-                hallway = Hallway(start, end)
+                hallway = Hallway(start, end, self.tile_map, self.random)
                 hallway.create_horz_path()
-                self.tile_map[(r1_door_x, door_y)].set_id(DOOR)
-                self.tile_map[(r1_door_x, door_y)].draw()
-                self.tile_map[(r2_door_x, door_y)].set_id(DOOR)
-                self.tile_map[(r2_door_x, door_y)].draw()
-                hallway.draw()
+                self.add_door(hallway, (r1_door_x, door_y))
+                self.add_door(hallway, (r2_door_x, door_y))
             else:
                 if DEBUG_CONNECT:
                     print("Vertical Hallway")
-                door_x = random.choice(list(overlap_x))
+                door_x = self.random.choice(overlap_x)
                 if r1.y < r2.y:
                     r1_door_y = r1.y + r1.height - 1
                     r2_door_y = r2.y
@@ -811,23 +1352,26 @@ class Dungeon(pygame.sprite.Sprite):
                     r2_door_y = r2.y + r2.height - 1
                     start = (door_x, r2_door_y + 1)
                     end = (door_x, r1_door_y - 1)
-                hallway = Hallway(start, end)
+                hallway = Hallway(start, end, self.tile_map, self.random)
                 hallway.create_vert_path()
-                self.tile_map[(door_x, r1_door_y)].set_id(DOOR)
-                self.tile_map[(door_x, r1_door_y)].draw()
-                self.tile_map[(door_x, r2_door_y)].set_id(DOOR)
-                self.tile_map[(door_x, r2_door_y)].draw()
-                hallway.draw()
+                self.add_door(hallway, (door_x, r1_door_y))
+                self.add_door(hallway, (door_x, r2_door_y))
         if DEBUG_CONNECT:
             print(hallway)
         self.hallways.append(hallway)
-        self.tile_map.update(hallway.get_path())
+        return hallway
 
     @staticmethod
     def closest_room_pair(room_iterable_1, room_iterable_2):
         """ Find a pair of rooms from two different lists of rooms that are
             the closest together.
 
+            The rooms of sister partitions lie on either side of the line
+            splitting their parent, so all the centers of one list come
+            before those of the other along that axis. Such lists are
+            searched with sweep_room_pair instead of comparing every pair
+            of rooms. Ties go to the pair that comes first in the lists.
+
             Arguments:
                 room_iterable_1 (iterable: Room): first iterable of rooms
                 room_iterable_2 (iterable: Room): second iterable of rooms
@@ -835,11 +1379,25 @@ class Dungeon(pygame.sprite.Sprite):
             Returns:
                 room_pair (tuple: Room): pair of rooms that are closest
                                          together
+
+            Runtime: O((n + m) log n) for lists of n and m rooms split
+                along an axis, O(n * m) otherwise
         """
+        rooms_1 = list(room_iterable_1)
+        rooms_2 = list(room_iterable_2)
+        if not rooms_1 or not rooms_2:
+            return None
+        for axis in (0, 1):
+            for sign in (1, -1):
+                if max(sign * room.center[axis] for room in rooms_1) \
+                    <= min(sign * room.center[axis] for room in rooms_2):
+                        return Dungeon.sweep_room_pair(rooms_1, rooms_2,
+                                                       axis, sign)
+
         room_pair = None
         min_dist = float("inf")
-        for room1 in room_iterable_1:
-            for room2 in room_iterable_2:
+        for room1 in rooms_1:
+            for room2 in rooms_2:
                 dist = abs(room1.center[0] - room2.center[0]) \
                         + abs(room1.center[1] - room2.center[1])
                 if dist < min_dist:
@@ -847,21 +1405,93 @@ class Dungeon(pygame.sprite.Sprite):
                     room_pair = (room1, room2)
         return room_pair
 
+    @staticmethod
+    def sweep_room_pair(rooms_1, rooms_2, axis, sign):
+        """ Find the closest pair of rooms from two lists of rooms split
+            along an axis
+
+            With every room of rooms_1 before every room of rooms_2 along
+            the axis, the distance along it is a difference of coordinates
+            and only the distance across it needs an absolute value. The
+            rooms of rooms_1 are sorted across the axis, so the closest one
+            to a room of rooms_2 is either the best one before it in that
+            order or the best one after it, kept as running minima and
+            found with a binary search.
+
+            Arguments:
+                rooms_1 (list: Room): first list of rooms
+                rooms_2 (list: Room): second list of rooms
+                axis (int): 0 if the lists are split along x, 1 along y
+                sign (int): 1 if the centers of rooms_2 are all at or after
+                    those of rooms_1 along the axis, -1 if at or before
+
+            Returns:
+                room_pair (tuple: Room): pair of rooms that are closest
+                                         together, the first one in the lists
+                                         (rooms_1 first) in case of a tie
+        """
+        across = 1 - axis
+        order = sorted(range(len(rooms_1)),
+                       key=lambda i: rooms_1[i].center[across])
+        positions = [rooms_1[i].center[across] for i in order]
+
+        # (distance without the coordinates of the room of rooms_2, index)
+        # of the best room of rooms_1 up to and from each position
+        up_to = []
+        best = None
+        for i in order:
+            center = rooms_1[i].center
+            key = (-sign * center[axis] - center[across], i)
+            if best is None or key < best:
+                best = key
+            up_to.append(best)
+        from_here = [None] * len(order)
+        best = None
+        for position in reversed(range(len(order))):
+            i = order[position]
+            center = rooms_1[i].center
+            key = (-sign * center[axis] + center[across], i)
+            if best is None or key < best:
+                best = key
+            from_here[position] = best
+
+        closest = None
+        for j, room in enumerate(rooms_2):
+            along = sign * room.center[axis]
+            position = room.center[across]
+            end = bisect.bisect_right(positions, position)
+            if end > 0:
+                dist, i = up_to[end - 1]
+                candidate = (dist + along + position, i, j)
+                if closest is None or candidate < closest:
+                    closest = candidate
+            start = bisect.bisect_left(positions, position)
+            if start < len(order):
+                dist, i = from_here[start]
+                candidate = (dist + along - position, i, j)
+                if closest is None or candidate < closest:
+                    closest = candidate
+        return (rooms_1[closest[1]], rooms_2[closest[2]])
+
     def create_all_hallway_borders(self):
         """  Create borders around all hallways in dungeon """
+        bounds = pygame.Rect(0, 0, self.width, self.height)
         for hallway in self.hallways:
-            for tile in hallway.get_path_list():
-                for neighbour in self.neighbours(tile):
-                    if neighbour.get_id() == VOID:
-                        neighbour.set_id(WALL)
-                        neighbour.draw()
+            for section in hallway.sections:
+                # Every neighbour of the section, diagonals included
+                area = section.inflate(2, 2).clip(bounds)
+                ids = self.tile_map.region(area)
+                void = ids == VOID
+                if void.any():
+                    self.tile_map.set_region(area.topleft,
+                        np.where(void, WALL, ids).astype(np.uint8))
 
     def generate_dungeon(self, region_x, region_y, region_width, region_height):
         """ Creates dungeon using Binary Space Partitioning
 
             Binary Space Partitioning as applied to game map generation will
-            recursively divide the dungeon along a random dimension (left,
-            right) each function call.
+            divide the dungeon along a random dimension (left, right), then
+            divide each of the two sub regions the same way, and so on.
             Once the sub regions cannot be split anymore or the region falls
             within a desired size, a room will be generated within the region.
             Since room within the region is surrounded by void space due to
@@ -877,6 +1507,10 @@ class Dungeon(pygame.sprite.Sprite):
                 every once in a while, perhaps more checks need to be done to
                 ensure whether the connection can be made.
 
+            The tree of regions is walked with an explicit stack rather than
+            recursion, so the size of the dungeon is not limited by the
+            recursion limit. The tree is kept in self.partition.
+
             Arguments:
                 region_x (int): x position of topleft corner of region
                 region_y (int): y position of topleft corner of region
@@ -884,18 +1518,27 @@ class Dungeon(pygame.sprite.Sprite):
                 region_height (int): height of enclosing region
 
             Returns:
-                rooms (set: Room): set of generated rooms, each rooms is an
+                rooms (list: Room): list of generated rooms, each rooms is an
                     instance of the Room class
         """
-        rooms = set()
-        if DEBUG_SPLIT:
-            print("Generating")
-            print("region: ( {}, {}, {}, {} )".format(region_x, region_y,
-                                                region_width, region_height))
+        self.partition = self.split_region(region_x, region_y,
+                                            region_width, region_height)
+        self.create_rooms(self.partition)
+        return self.connect_partitions(self.partition)
 
+    def choose_split(self, partition):
+        """ Picks the direction a region is split in
+
+            Arguments:
+                partition (Partition): region to split
+
+            Returns:
+                dung_split (str): "horz" or "vert", None if the region is too
+                    small to be split
+        """
         if BSP_CHECK_SPLIT_FIRST:
             choices = []
-            if region_height >= 2*Dungeon.MIN_HEIGHT:
+            if partition.height >= 2*Dungeon.MIN_HEIGHT:
                 # If you subtract the minimum dungeon height from the top and
                 # bottom of the region, you are left with a sort of bandwidth
                 # regin where the split line can be placed such that
@@ -903,92 +1546,143 @@ class Dungeon(pygame.sprite.Sprite):
                 # will be surrounded by void. If such a bandwith cannot be
                 # created, then the region cannot be split horizontally.
                 choices.append("horz")
-            if region_width >= 2*Dungeon.MIN_WIDTH:
+            if partition.width >= 2*Dungeon.MIN_WIDTH:
                 # Similar logic as checking horiziontal split
                 choices.append("vert")
             if not choices:
-                room = self.add_rand_room(region_x, region_y,
-                                            region_width, region_height)
-                return set([room])
-            dung_split = random.choice(choices)
-        else:
-            split = True
-            if region_height < 2*Dungeon.MIN_HEIGHT:
-                # If you subtract the minimum dungeon height from the top and
-                # bottom of the region, you are left with a sort of bandwidth
-                # regin where the split line can be placed such
-                # that a room will be contained within the region and
-                # will be surrounded by void. If such a bandwith cannot be
-                # created, then the region cannot be split horizontally.
-                if DEBUG_SPLIT:
-                    print("can't split horizontally")
-                split = False
-            if region_width < 2*Dungeon.MIN_WIDTH:
-                # Similar logic as checking horiziontal split
-                if DEBUG_SPLIT:
-                    print("can't split vertically")
-                split = False
-            if not split:
-                room = self.add_rand_room(region_x, region_y,
-                                            region_width, region_height)
-                return set([room])
-            dung_split = random.choice(["vert", "horz"])
+                return None
+            return self.random.choice(choices)
+
+        split = True
+        if partition.height < 2*Dungeon.MIN_HEIGHT:
+            # If you subtract the minimum dungeon height from the top and
+            # bottom of the region, you are left with a sort of bandwidth
+            # regin where the split line can be placed such
+            # that a room will be contained within the region and
+            # will be surrounded by void. If such a bandwith cannot be
+            # created, then the region cannot be split horizontally.
+            if DEBUG_SPLIT:
+                print("can't split horizontally")
+            split = False
+        if partition.width < 2*Dungeon.MIN_WIDTH:
+            # Similar logic as checking horiziontal split
+            if DEBUG_SPLIT:
+                print("can't split vertically")
+            split = False
+        if not split:
+            return None
+        return self.random.choice(["vert", "horz"])
 
-        if DEBUG_SPLIT:
-            print(dung_split)
-        if dung_split == "horz":
-            top_height = random.randint(Dungeon.MIN_HEIGHT,
-                            region_height - Dungeon.MIN_HEIGHT)
-            top = (region_x, region_y, region_width, top_height)
-            bottom = (region_x, region_y + top_height,
-                        region_width, region_height - top_height)
-            if VISUALIZE_SPLIT:
-                start = (bottom[0] * TILE_SIZE, bottom[1] * TILE_SIZE)
-                end = ((bottom[0] + region_width) * TILE_SIZE, start[1])
-                pygame.draw.line(self.screen, green, start, end, TILE_SIZE)
-            top_rooms = set()
-            bottom_rooms = set()
-            top_rooms |= self.generate_dungeon(*top)
-            bottom_rooms |= self.generate_dungeon(*bottom)
+    def split_region(self, region_x, region_y, region_width, region_height):
+        """ Splits a region into the tree of partitions used by the BSP
+
+            Only describes the regions, no rooms are created.
+
+            Arguments:
+                region_x (int): x position of topleft corner of region
+                region_y (int): y position of topleft corner of region
+                region_width (int): width of enclosing region
+                region_height (int): height of enclosing region
+
+            Returns:
+                root (Partition): partition of the whole region
+        """
+        root = Partition(region_x, region_y, region_width, region_height)
+        to_split = [root]
+        while to_split:
+            partition = to_split.pop()
             if DEBUG_SPLIT:
-                print("top rooms: ")
-                print(*top_rooms, end="\n")
-                print("bottom rooms: ")
-                print(*bottom_rooms, end="\n")
-            r1, r2 = self.closest_room_pair(top_rooms, bottom_rooms)
+                print("Generating")
+                print(partition)
+            dung_split = self.choose_split(partition)
+            if dung_split is None:
+                continue
             if DEBUG_SPLIT:
-                print("r1: ", r1)
-                print("r2: ", r2)
-            if r1 is not None and r2 is not None:
-                if VHL_CONNECT:
-                    self.connect_rooms(r1, r2)
-            rooms.update(top_rooms | bottom_rooms)
-        else:
-            left_width = random.randint(Dungeon.MIN_WIDTH,
-                            region_width - Dungeon.MIN_WIDTH)
-            left = (region_x, region_y, left_width, region_height)
-            right = (region_x + left_width, region_y,
-                        region_width - left_width, region_height)
-            if VISUALIZE_SPLIT:
-                start = (right[0] * TILE_SIZE, right[1] * TILE_SIZE)
-                end = (start[0], (right[1] + region_height) * TILE_SIZE)
-                pygame.draw.line(self.screen, green, start, end, TILE_SIZE)
-            left_rooms = set()
-            right_rooms = set()
-            left_rooms |= self.generate_dungeon(*left)
-            right_rooms |= self.generate_dungeon(*right)
+                print(dung_split)
+
+            x, y = partition.x, partition.y
+            width, height = partition.width, partition.height
+            if dung_split == "horz":
+                top_height = self.random.randint(Dungeon.MIN_HEIGHT,
+                                height - Dungeon.MIN_HEIGHT)
+                top = Partition(x, y, width, top_height)
+                bottom = Partition(x, y + top_height,
+                            width, height - top_height)
+                partition.children = [top, bottom]
+            else:
+                left_width = self.random.randint(Dungeon.MIN_WIDTH,
+                                width - Dungeon.MIN_WIDTH)
+                left = Partition(x, y, left_width, height)
+                right = Partition(x + left_width, y,
+                            width - left_width, height)
+                partition.children = [left, right]
+            partition.split = dung_split
+            # Push the second child first so the first one is split first
+            to_split.extend(reversed(partition.children))
+        return root
+
+    def iter_partitions(self, root=None):
+        """ Walks the tree of partitions, parents before their children
+
+            Arguments:
+                root (Partition): partition to start from, default is the
+                    partition of the whole dungeon
+
+            Returns:
+                partitions (generator: Partition): every partition of the tree
+        """
+        to_visit = [root if root is not None else self.partition]
+        while to_visit:
+            partition = to_visit.pop()
+            if partition is None:
+                continue
+            yield partition
+            to_visit.extend(reversed(partition.children))
+
+    def create_rooms(self, root):
+        """ Generates a room within every leaf of a tree of partitions
+
+            Arguments:
+                root (Partition): partition to start from
+        """
+        for partition in self.iter_partitions(root):
+            if partition.is_leaf():
+                partition.room = self.add_rand_room(partition.x, partition.y,
+                                    partition.width, partition.height)
+
+    def connect_partitions(self, root):
+        """ Connects the rooms of every pair of sister partitions
+
+            Sisters are connected bottom-up, through their closest pair of
+            rooms, once all the rooms within each of them are connected.
+
+            Arguments:
+                root (Partition): partition to start from
+
+            Returns:
+                rooms (list: Room): list of all rooms within root
+        """
+        rooms = {}
+        # Children come after their parent, so reversing the walk visits
+        # every partition after its children
+        for partition in reversed(list(self.iter_partitions(root))):
+            if partition.is_leaf():
+                rooms[partition] = [partition.room]
+                continue
+            first, second = partition.children
+            first_rooms = rooms.pop(first)
+            second_rooms = rooms.pop(second)
             if DEBUG_SPLIT:
-                print("left rooms: ")
-                print(*left_rooms, end="\n")
-                print("right rooms: ")
-                print(*right_rooms, end="\n")
-            r1, r2 = self.closest_room_pair(left_rooms, right_rooms)
+                print("first rooms: ")
+                print(*first_rooms, end="\n")
+                print("second rooms: ")
+                print(*second_rooms, end="\n")
+            r1, r2 = self.closest_room_pair(first_rooms, second_rooms)
             if DEBUG_SPLIT:
                 print("r1: ", r1)
                 print("r2: ", r2)
             if r1 is not None and r2 is not None:
                 if VHL_CONNECT:
-                    self.connect_rooms(r1, r2)
-            rooms.update(left_rooms | right_rooms)
-
-        return rooms
+                    partition.hallway = self.connect_rooms(r1, r2)
+            rooms[partition] = first_rooms + second_rooms
+        return rooms[root]
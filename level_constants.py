@@ -1,21 +1,64 @@
+import os
 import pygame
 from pygame.locals import *
 
+from headless import NullSurface
+from assets import AssetCache, AssetMap
+
 # game dungeon dimensions
 TILE_SIZE = 30
 MAP_WIDTH = 20
 MAP_HEIGHT = 20
 
+# tiles of very large dungeons can be kept in a file, in square chunks
+CHUNK_SIZE = 64 # tiles per side, a chunk of one byte ids fills a 4kB page
+MAX_CHUNKS = 16 # chunks mapped in memory at once
+
+# part of the dungeon shown in the window (the camera's view), in tiles
+# the dungeon can be larger, the camera then scrolls to follow the player
+VIEW_WIDTH = 20
+VIEW_HEIGHT = 20
+
 # Used to display player stats etc.
 DISPLAY_AREA_WIDTH = 10
 
+# frame profiler shown in the display area
+PROFILE_WINDOW = 30 # frames averaged
+PROFILE_REFRESH = 15 # frames between two redraws of the timings
+PROFILE_FONT_SIZE = 18
+PROFILE_MARGIN = 6
+
+# Run without a window or audio (null renderer and mixer),
+# enabled by setting the environment variable YADC_HEADLESS=1 before start
+HEADLESS = os.environ.get("YADC_HEADLESS", "0") == "1"
+
 # initialize game surface
-pygame.mixer.init()
-pygame.init()
-DISPLAY_SURFACE = \
-    pygame.display.set_mode(
-        ((MAP_WIDTH+DISPLAY_AREA_WIDTH)*TILE_SIZE, MAP_HEIGHT*TILE_SIZE))
-pygame.display.set_caption("YetAnotherDungeonCrawler (YADC)")
+if HEADLESS:
+    DISPLAY_SURFACE = NullSurface(
+        ((VIEW_WIDTH+DISPLAY_AREA_WIDTH)*TILE_SIZE, VIEW_HEIGHT*TILE_SIZE))
+else:
+    pygame.mixer.init()
+    pygame.init()
+    DISPLAY_SURFACE = \
+        pygame.display.set_mode(
+            ((VIEW_WIDTH+DISPLAY_AREA_WIDTH)*TILE_SIZE, VIEW_HEIGHT*TILE_SIZE))
+    pygame.display.set_caption("YetAnotherDungeonCrawler (YADC)")
+
+def create_surface(size):
+    """ Creates an off-screen surface in the format of the display
+
+        Arguments:
+            size (2-tuple: int): width and height in pixels
+
+        Returns:
+            surface (Pygame Surface): new surface (a NullSurface if headless)
+    """
+    if HEADLESS:
+        return NullSurface(size)
+    return pygame.Surface(size, 0, DISPLAY_SURFACE)
+
+# single cache for every image and sound, each loaded on first use
+assets = AssetCache(HEADLESS, (TILE_SIZE, TILE_SIZE))
 
 # color constants
 BLACK = (0,0,0)
@@ -23,15 +66,6 @@ WHITE = (255, 255, 255)
 GREEN = (0, 255, 0)
 SILVER = (192,192,192)
 
-# load images for tiles
-floor_img = pygame.image.load("assets/images/floor_scaled.jpg").convert()
-void_img = pygame.image.load("assets/images/void_scaled.jpg").convert()
-grass_img = pygame.image.load("assets/images/grass_scaled.jpg").convert()
-wall_img = pygame.image.load("assets/images/wall_scaled.jpg").convert()
-door_img = pygame.image.load("assets/images/door_scaled.jpg").convert()
-ladder_img = pygame.image.load("assets/images/ladder_scaled.jpg").convert()
-xmark_img = pygame.image.load("assets/images/xmark_scaled.jpg").convert()
-
 # constants to represent tiles
 VOID = 0
 FLOOR = 1
@@ -41,13 +75,13 @@ DOOR = 4
 LADDER = 5
 XMARK = 6
 
-# map of tile images: tile_id: image
-tile_images = {
-    VOID: void_img,
-    FLOOR: floor_img,
-    GRASS: grass_img,
-    WALL: wall_img,
-    DOOR: door_img,
-    LADDER: ladder_img,
-    XMARK: xmark_img
-}
+# map of tile images: tile_id: image (loaded on first use)
+tile_images = AssetMap(assets.image, {
+    VOID: "assets/images/void_scaled.jpg",
+    FLOOR: "assets/images/floor_scaled.jpg",
+    GRASS: "assets/images/grass_scaled.jpg",
+    WALL: "assets/images/wall_scaled.jpg",
+    DOOR: "assets/images/door_scaled.jpg",
+    LADDER: "assets/images/ladder_scaled.jpg",
+    XMARK: "assets/images/xmark_scaled.jpg"
+})
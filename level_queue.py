@@ -0,0 +1,130 @@
+# Generates upcoming levels in a worker thread while the current one is
+# played, so reaching the ladder only swaps in a level that is already built
+# instead of stalling the game loop on dungeon generation.
+
+#modules/libraries
+import random
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+#imported scripts
+import level
+from level_constants import *
+import gameplay
+from gameplay_constants import *
+
+
+class Level():
+    '''
+    Everything needed to start playing a level, built ahead of time.
+    The player and enemies are only created from their spawn points
+    when the level is started.
+    Args:
+        dungeon (Dungeon): generated dungeon, rendered by getlevel
+        playerspawn (tuple): pixel position the player starts at
+        enemyspawns (list): (x, y, spritenum) of every enemy, in pixels
+        weightedgrid (WeightedTileGrid): graph used by the enemies to path
+    '''
+    def __init__(self, dungeon, playerspawn, enemyspawns, weightedgrid):
+        self.dungeon = dungeon
+        self.playerspawn = playerspawn
+        self.enemyspawns = enemyspawns
+        self.weightedgrid = weightedgrid
+
+    def spawnplayer(self):
+        '''
+        Returns:
+            player (Player): new player at the spawn point
+        '''
+        return gameplay.Player(self.playerspawn[0], self.playerspawn[1], 0)
+
+    def spawnenemies(self):
+        '''
+        Returns:
+            enemies (EnemyStore): store of new enemies at their spawn points
+        '''
+        enemies = gameplay.EnemyStore(len(self.enemyspawns))
+        for x, y, spritenum in self.enemyspawns:
+            gameplay.Enemy(x, y, spritenum, enemies)
+        return enemies
+
+
+def buildlevel(seed=None, width=MAP_WIDTH, height=MAP_HEIGHT):
+    '''
+    Generate a level: dungeon, spawn points, ladder and path graph.
+    Only tile ids are worked on, no surface is rendered, so it can run in
+    a worker thread; the view is rendered once the level is taken.
+    Args:
+        seed (int): seed of the dungeon, None for a random one
+        width (int): dungeon width in tiles
+        height (int): dungeon height in tiles
+    Returns:
+        newlevel (Level): level ready to be started
+    '''
+    dungeon = level.Dungeon(height, width, seed, render=False)
+    rng = dungeon.random
+
+    player_room = dungeon.pick_random_room()
+    playerspawn = tuple([c*TILE_SIZE for c in player_room.pick_interior_point()])
+
+    enemyspawns = []
+    for enemy in range(rng.randint(1, 5)):
+        enemy_room = rng.choice(dungeon.filter_rooms(player_room))
+        x, y = [c*TILE_SIZE for c in enemy_room.pick_interior_point()]
+        enemyspawns.append((x, y, rng.randint(1, 2)))
+
+    dungeon.place_ladder(player_room)
+    #start with the player in view, rendered by getlevel
+    dungeon.camera.follow(playerspawn)
+
+    weightedgrid = gameplay.WeightedTileGrid(width, height)
+    weightedgrid.getwalls(dungeon)
+    weightedgrid.getnavgraph(dungeon)
+    return Level(dungeon, playerspawn, enemyspawns, weightedgrid)
+
+
+class LevelQueue():
+    '''
+    Queue of levels generated in the background.
+    A worker thread keeps up to size levels built ahead of the one being
+    played; getlevel hands over the oldest, waiting only if it is not done.
+    Args:
+        size (int): number of levels to keep ready
+        seed (int): seed for the seeds of the levels, None for random ones
+        width (int): dungeon width in tiles
+        height (int): dungeon height in tiles
+    '''
+    def __init__(self, size=2, seed=None, width=MAP_WIDTH, height=MAP_HEIGHT):
+        self.size = size
+        self.seeds = random.Random(seed)
+        self.width = width
+        self.height = height
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='levelqueue')
+        self.pending = collections.deque()
+        self.fill()
+
+    def fill(self):
+        '''Start generating levels until size of them are queued.'''
+        while len(self.pending) < self.size:
+            seed = self.seeds.getrandbits(32)
+            self.pending.append(self.executor.submit(
+                buildlevel, seed, self.width, self.height))
+
+    def getlevel(self):
+        '''
+        Take the next level and start generating a replacement.
+        The view of the level is rendered here, on the calling thread.
+        Returns:
+            newlevel (Level): the oldest queued level
+        '''
+        newlevel = self.pending.popleft().result()
+        dungeon = newlevel.dungeon
+        dungeon.tile_map.render(dungeon.camera.view)
+        self.fill()
+        return newlevel
+
+    def shutdown(self):
+        '''Stop the worker, dropping levels that were not started yet.'''
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending.clear()
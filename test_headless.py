@@ -0,0 +1,25 @@
+# Smoke test of the headless mode (see HEADLESS in level_constants.py):
+# imports the game without a window or audio device and steps the game loop.
+# Run with "python3 test_headless.py" (or pytest).
+
+#modules/libraries
+import os
+
+#must be set before the game modules are imported
+os.environ["YADC_HEADLESS"] = "1"
+
+#imported scripts
+import YADC
+
+
+FRAMES = 60
+
+def test_game_loop():
+    YADC.main(frames=FRAMES)
+    assert YADC.dungeon is not None
+    assert YADC.player is not None
+
+
+if __name__ == '__main__':
+    test_game_loop()
+    print("stepped", FRAMES, "frames headless")
@@ -13,42 +13,37 @@ dungeon = level.Dungeon()
 if not level.ENABLE_GEN and TEST_ADD_HALLWAY:
     room1 = level.Room(0,0,6,6)
     dungeon.rooms.append(room1)
-    dungeon.update_tilemap(room1)
-    room1.draw()
+    room1.write(dungeon.tile_map)
 
     room2 = level.Room(10,10,6,6)
     dungeon.rooms.append(room2)
-    dungeon.update_tilemap(room2)
-    room2.draw()
+    room2.write(dungeon.tile_map)
 
     dungeon.add_hallway()
 if not level.ENABLE_GEN and TEST_CONNECT:
     room1 = level.Room(0, 10, 9, 9)
     dungeon.rooms.append(room1)
-    dungeon.update_tilemap(room1)
-    room1.draw()
+    room1.write(dungeon.tile_map)
 
     room2 = level.Room(0, 0, 6, 6)
     dungeon.rooms.append(room2)
-    dungeon.update_tilemap(room2)
-    room2.draw()
+    room2.write(dungeon.tile_map)
 
     dungeon.connect_rooms(room1, room2)
 
 if not level.ENABLE_GEN and TEST_LSHAPED:
     room1 = level.Room(0, 0, 4, 4)
     dungeon.rooms.append(room1)
-    dungeon.update_tilemap(room1)
-    room1.draw()
+    room1.write(dungeon.tile_map)
 
     room2 = level.Room(10, 10, 6, 6)
     dungeon.rooms.append(room2)
-    dungeon.update_tilemap(room2)
-    room2.draw()
+    room2.write(dungeon.tile_map)
 
     dungeon.connect_rooms(room1, room2)
     dungeon.create_all_hallway_borders()
 
+dungeon.draw((dungeon.width,), (dungeon.height,))
 print("done")
 # Print to screen
 while True: